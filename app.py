@@ -1,4 +1,5 @@
 import os
+import click
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from oauth import setup_oauth
@@ -12,13 +13,18 @@ import json
 from functools import wraps
 import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from flask_migrate import Migrate
 # Import the User model from models
 from extensions import db, migrate, login_manager
-from models import User
+from models import User, Summary, Upload
+from utils.storage_codec import train_dictionary
+from utils.jobs import get_job_manager, DONE
 from routes import plans_bp
 from pdf_routes import pdf_bp
 from main_routes import main_bp
+from decorators import close_request_document
+from utils.uploads import SpoolingRequest
 from flask_migrate import upgrade as db_upgrade
 
 # Configure logging
@@ -28,6 +34,8 @@ logger = logging.getLogger(__name__)
 def create_app(testing=False, **kwargs):
     """Create and configure the Flask application."""
     app = Flask(__name__, template_folder="templates", **kwargs)
+    # Large uploads are parsed into named files that extraction can adopt
+    app.request_class = SpoolingRequest
     
     # Basic configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_for_testing')
@@ -42,7 +50,9 @@ def create_app(testing=False, **kwargs):
     # Database configuration
     app.config['TESTING'] = testing
     if testing:
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        # In-memory SQLite is one connection shared by every thread, so tests
+        # that run background jobs point this at a file instead
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('TEST_DATABASE_URL', 'sqlite:///:memory:')
     else:
         app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///users.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -56,11 +66,26 @@ def create_app(testing=False, **kwargs):
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Release any PDF parsed during the request
+    app.teardown_appcontext(close_request_document)
+    
     # Register blueprints
     app.register_blueprint(main_bp)
     app.register_blueprint(plans_bp, url_prefix='/plans')
     app.register_blueprint(pdf_bp, url_prefix='/pdf')
     
+    @app.cli.command('train-codec-dictionary')
+    @click.argument('output')
+    @click.option('--samples', default=2000, help='Number of recent summaries to train on')
+    def train_codec_dictionary(output, samples):
+        """Train a compression dictionary on recent summaries (use with STORAGE_CODEC_DICTIONARY)."""
+        texts = [summary.text for summary in
+                 Summary.query.filter_by(status=DONE).order_by(Summary.created_at.desc()).limit(samples)]
+        dictionary = train_dictionary(texts)
+        with open(output, 'wb') as file:
+            file.write(dictionary)
+        click.echo(f"Wrote a {len(dictionary)} byte dictionary trained on {len(texts)} summaries to {output}")
+    
     # Setup OAuth only if not testing
     if not testing:
         setup_oauth(app)
@@ -72,15 +97,37 @@ def create_app(testing=False, **kwargs):
             db.create_all()
             logger.info("Database tables created or confirmed to exist!")
             
-            # Check if oauth_provider column exists in User table
-            with db.engine.connect() as conn:
-                result = conn.execute("PRAGMA table_info(user)")
-                columns = [row[1] for row in result]
-                
-                if 'oauth_provider' not in columns:
-                    logger.info("Adding oauth_provider column to User table...")
-                    conn.execute("ALTER TABLE user ADD COLUMN oauth_provider VARCHAR(20)")
-                    logger.info("oauth_provider column added successfully!")
+            # Check if oauth_provider column exists in User table. This must
+            # not fail on a healthy database: the fallback below drops every
+            # table, stored summaries included.
+            columns = [column['name'] for column in inspect(db.engine).get_columns('user')]
+            
+            if 'oauth_provider' not in columns:
+                logger.info("Adding oauth_provider column to User table...")
+                with db.engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE user ADD COLUMN oauth_provider VARCHAR(20)"))
+                logger.info("oauth_provider column added successfully!")
+            
+            # Job status and batch columns added to the summary table after it was created
+            columns = [column['name'] for column in inspect(db.engine).get_columns('summary')]
+            added_columns = {
+                'status': "VARCHAR(20) NOT NULL DEFAULT 'done'",
+                'error': "VARCHAR(255)",
+                'token_count': "INTEGER",
+                'batch_id': "VARCHAR(36)",
+                'batch_index': "INTEGER",
+                'heartbeat_at': "DATETIME",
+            }
+            for name, definition in added_columns.items():
+                if name not in columns:
+                    logger.info(f"Adding {name} column to Summary table...")
+                    with db.engine.begin() as conn:
+                        conn.execute(text(f"ALTER TABLE summary ADD COLUMN {name} {definition}"))
+            
+            # create_all() skips indexes added to tables that already exist
+            for table in (Upload.__table__, Summary.__table__):
+                for index in table.indexes:
+                    index.create(db.engine, checkfirst=True)
                     
         except Exception as e:
             logger.error(f"Error during database initialization: {str(e)}")
@@ -89,6 +136,21 @@ def create_app(testing=False, **kwargs):
             db.create_all()
             logger.info("Database tables recreated!")
     
+    # Jobs only live in memory, so jobs of a worker that died are failed
+    # here and when their status is read; live workers keep theirs fresh
+    with app.app_context():
+        try:
+            failed = Summary.fail_stale()
+            if failed:
+                logger.info(f"Failed {failed} summaries whose jobs were interrupted")
+        except Exception as e:
+            logger.error(f"Error failing interrupted summaries: {str(e)}")
+    
+    def beat(summary_ids):
+        with app.app_context():
+            Summary.beat(summary_ids)
+    get_job_manager().start_heartbeat(beat)
+    
     return app
 
 if __name__ == '__main__':
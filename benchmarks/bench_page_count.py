@@ -0,0 +1,171 @@
+"""
+Benchmark the page-count probe against building a full PyPDF2 reader.
+
+Generates a synthetic corpus of PDFs with PyPDF2's writer (text pages of
+varying size, plus incrementally updated files and files rewritten with a
+cross-reference stream) and times both ways of counting pages on each one.
+The probe can't follow xref streams and falls back to a full parse, so
+those rows show what that fallback costs.
+
+Usage:
+    python benchmarks/bench_page_count.py [--repeat N] [--keep DIR]
+"""
+import os
+import sys
+import time
+import zlib
+import shutil
+import argparse
+import tempfile
+import statistics
+
+import PyPDF2
+from PyPDF2.generic import DecodedStreamObject, NameObject, DictionaryObject
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.pdf_processor import probe_page_count
+
+PAGE_COUNTS = [1, 5, 20, 30, 100, 300]
+
+
+def _text_page(writer, line_count):
+    """Add a page carrying line_count lines of Helvetica text"""
+    page = writer.add_blank_page(width=612, height=792)
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    })
+    page[NameObject('/Resources')] = DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/F1'): writer._add_object(font)}),
+    })
+    lines = "".join(f"0 -14 Td (Synthetic line {i} of benchmark text for the probe.) Tj "
+                    for i in range(line_count))
+    content = DecodedStreamObject()
+    content.set_data(f"BT /F1 11 Tf 72 760 Td {lines}ET".encode('latin-1'))
+    page[NameObject('/Contents')] = writer._add_object(content)
+
+
+def _incremental_update(base_path):
+    """Append a revision that trims the page tree down to its first page"""
+    with open(base_path, 'rb') as file:
+        data = file.read()
+    reader = PyPDF2.PdfReader(base_path)
+    root = reader.trailer.raw_get('/Root')
+    pages = reader.trailer['/Root'].raw_get('/Pages')
+    first_kid = reader.trailer['/Root']['/Pages'].raw_get('/Kids')[0]
+    previous_xref = int(data[data.rindex(b'startxref'):].split()[1])
+
+    offset = len(data)
+    body = (f"{pages.idnum} 0 obj\n<< /Type /Pages /Kids [{first_kid.idnum} 0 R] /Count 1 >>\n"
+            f"endobj\n").encode('latin-1')
+    xref_offset = offset + len(body)
+    xref = (f"xref\n0 1\n0000000000 65535 f \n{pages.idnum} 1\n{offset:010d} 00000 n \n"
+            f"trailer\n<< /Size {reader.trailer['/Size']} /Root {root.idnum} 0 R /Prev {previous_xref} >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n").encode('latin-1')
+    return data + body + xref
+
+
+def _xref_stream(base_path):
+    """Rewrite a file's classic xref table and trailer as a PDF 1.5 xref stream"""
+    with open(base_path, 'rb') as file:
+        data = file.read()
+    reader = PyPDF2.PdfReader(base_path)
+    offsets = dict(reader.xref[0])
+    root = reader.trailer.raw_get('/Root')
+    body = data[:data.rindex(b'\nxref') + 1]
+
+    stream_number = max(offsets) + 1
+    offsets[stream_number] = len(body)
+    # Each entry: type (1 byte), offset (4 bytes), generation (2 bytes)
+    entries = bytearray(b'\x00\x00\x00\x00\x00\xff\xff')
+    for number in range(1, stream_number + 1):
+        if number in offsets:
+            entries += b'\x01' + offsets[number].to_bytes(4, 'big') + b'\x00\x00'
+        else:
+            entries += b'\x00\x00\x00\x00\x00\x00\x00'
+    stream = zlib.compress(bytes(entries))
+    xref = (f"{stream_number} 0 obj\n<< /Type /XRef /Size {stream_number + 1} /W [1 4 2] "
+            f"/Root {root.idnum} 0 R /Filter /FlateDecode /Length {len(stream)} >>\nstream\n"
+            ).encode('latin-1') + stream + b"\nendstream\nendobj\n"
+    return body + xref + f"startxref\n{len(body)}\n%%EOF\n".encode('latin-1')
+
+
+def build_corpus(directory):
+    """Write the synthetic corpus and return (path, expected_pages) pairs"""
+    corpus = []
+    for page_count in PAGE_COUNTS:
+        for line_count in (5, 50):
+            writer = PyPDF2.PdfWriter()
+            for _ in range(page_count):
+                _text_page(writer, line_count)
+            path = os.path.join(directory, f"doc_{page_count}p_{line_count}l.pdf")
+            with open(path, 'wb') as file:
+                writer.write(file)
+            corpus.append((path, page_count))
+
+        # Incremental update that appends a revised page tree
+        base_path = os.path.join(directory, f"doc_{page_count}p_5l.pdf")
+        path = os.path.join(directory, f"doc_{page_count}p_updated.pdf")
+        with open(path, 'wb') as file:
+            file.write(_incremental_update(base_path))
+        corpus.append((path, 1))
+
+        # Same document with a cross-reference stream instead of a table
+        path = os.path.join(directory, f"doc_{page_count}p_xrefstm.pdf")
+        with open(path, 'wb') as file:
+            file.write(_xref_stream(base_path))
+        corpus.append((path, page_count))
+    return corpus
+
+
+def full_parse_page_count(file_path):
+    """The approach check_page_limit used before the probe"""
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def time_call(func, path, repeat):
+    """Return (result, list of timings in ms)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per file")
+    parser.add_argument('--keep', help="write the corpus here and keep it")
+    args = parser.parse_args()
+
+    directory = args.keep or tempfile.mkdtemp(prefix='page_count_bench_')
+    os.makedirs(directory, exist_ok=True)
+    try:
+        corpus = build_corpus(directory)
+        print(f"{'file':<28}{'size KB':>9}{'pages':>7}{'reader ms':>11}{'probe ms':>10}{'speedup':>9}")
+        reader_total = probe_total = 0.0
+        for path, expected in corpus:
+            reader_count, reader_times = time_call(full_parse_page_count, path, args.repeat)
+            probe_count, probe_times = time_call(probe_page_count, path, args.repeat)
+            if probe_count != expected:
+                print(f"MISMATCH {path}: probe={probe_count} expected={expected} reader={reader_count}")
+            reader_ms = statistics.median(reader_times)
+            probe_ms = statistics.median(probe_times)
+            reader_total += reader_ms
+            probe_total += probe_ms
+            print(f"{os.path.basename(path):<28}{os.path.getsize(path) / 1024:>9.1f}{probe_count:>7}"
+                  f"{reader_ms:>11.2f}{probe_ms:>10.2f}{reader_ms / probe_ms:>8.1f}x")
+        print(f"{'total (median per file)':<44}{reader_total:>11.2f}{probe_total:>10.2f}"
+              f"{reader_total / probe_total:>8.1f}x")
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,49 @@
 from functools import wraps
-from flask import flash, redirect, url_for, request, abort
+from flask import flash, redirect, url_for, request, abort, g, current_app
 from flask_login import current_user
-import os
-from werkzeug.utils import secure_filename
-from models import db, Upload, MonthlyUsage
-import tempfile
+from models import db, Upload, MonthlyUsage, DailyUsage
+from utils.pdf_processor import PdfDocument, extract_pages
+from utils.token_counter import count_tokens
+from utils.uploads import ingest_upload
 
 
+def open_request_document(source):
+    """
+    Get the parsed PDF for the current request, parsing it on first use.
+
+    Every stage of a request that needs the PDF (page-limit check, text
+    extraction, usage tracking) shares this one document.
+
+    Args:
+        source (IngestedUpload or str): The request's upload, or a path
+    """
+    document = g.get('pdf_document')
+    if document is None or (document.upload or document.file_path) != source:
+        if document is not None:
+            document.close()
+        document = PdfDocument(source)
+        g.pdf_document = document
+    return document
+
+def get_request_document():
+    """Get the PDF already parsed for the current request, if any"""
+    return g.get('pdf_document')
+
+def ingest_request_upload(file_storage):
+    """Read the request's uploaded file once; it is released at teardown"""
+    upload = ingest_upload(file_storage, max_size=g.get('upload_size_limit'))
+    g.pdf_upload = upload
+    return upload
+
+def close_request_document(exc=None):
+    """Close the request's parsed PDF and upload; registered as an app context teardown"""
+    document = g.pop('pdf_document', None)
+    if document is not None:
+        document.close()
+    upload = g.pop('pdf_upload', None)
+    if upload is not None:
+        upload.close()
+
 def plan_required(min_plan_level):
     """
     Decorator to restrict access based on user's plan level
@@ -57,6 +94,40 @@ def feature_required(feature_name):
         return decorated_function
     return decorator
 
+# Allowance on top of the file size limit for multipart boundaries and
+# the other form fields sent with an upload
+UPLOAD_FORM_OVERHEAD = 16 * 1024
+
+def get_upload_size_limit():
+    """Get the largest file the current visitor may upload, in bytes"""
+    if current_user.is_authenticated:
+        limit = current_user.get_max_upload_size()
+    else:
+        limit = current_app.config['FREE_TIER_MAX_SIZE']
+    
+    # Never exceed the application-wide cap
+    max_content_length = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_content_length:
+        limit = min(limit, max_content_length)
+    return limit
+
+def limit_upload_size(f):
+    """
+    Decorator to enforce the user's plan upload size while the body arrives
+    
+    Must run before anything touches request.files: the request's
+    max_content_length is lowered to the plan limit, so Werkzeug answers
+    413 from the Content-Length header, or as soon as a streamed body
+    crosses the limit, instead of buffering the whole upload first.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        limit = get_upload_size_limit()
+        g.upload_size_limit = limit
+        request.max_content_length = limit + UPLOAD_FORM_OVERHEAD
+        return f(*args, **kwargs)
+    return decorated_function
+
 def check_upload_limits(f):
     """
     Decorator to check if user has reached their monthly PDF upload limit
@@ -97,38 +168,111 @@ def check_page_limit(f):
             flash("Only PDF files are allowed", "error")
             return redirect(request.url)
             
-        # Save file temporarily to check page count
-        temp_dir = tempfile.gettempdir()
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(temp_dir, filename)
-        file.save(temp_path)
+        # Read the upload once: hash, sniff and spool it without a named temp file
+        upload = ingest_request_upload(file)
+        if not upload.is_pdf:
+            close_request_document()
+            flash("Only PDF files are allowed", "error")
+            return redirect(request.url)
         
-        # Get page count (using PyPDF2 or similar library)
-        # This is a placeholder - in a real app you would use a PDF library
+        # Probe the page count; later stages of this request reuse the document
         try:
-            import PyPDF2
-            with open(temp_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                page_count = len(pdf_reader.pages)
+            page_count = open_request_document(upload).page_count
         except Exception as e:
-            os.remove(temp_path)
+            close_request_document()
             flash(f"Error processing PDF: {str(e)}", "error")
             return redirect(request.url)
             
         # Check if page count exceeds limit
         max_pages = current_user.get_max_pages_per_file()
         if page_count > max_pages:
-            os.remove(temp_path)
+            close_request_document()
             flash(f"Your PDF has {page_count} pages, but your plan only allows {max_pages} pages per file.", "warning")
             return redirect(url_for('dashboard'))
             
-        # Store page count in session for later use
+        # Store page count on the request for later use
         request.page_count = page_count
-        request.temp_pdf_path = temp_path
+        request.pdf_upload = upload
             
         return f(*args, **kwargs)
     return decorated_function
 
+def record_usage(user, filename, page_count, token_count, document_type=None, summary_format=None,
+                 count_pdf=True):
+    """
+    Count one processed PDF against a user's monthly usage.
+
+    Args:
+        user (User): The user who processed the PDF
+        filename (str): Name of the uploaded file
+        page_count (int): Pages in the PDF
+        token_count (int): Tokens the PDF cost; actual LLM usage when known
+        document_type (str): Document type the user picked, if any
+        summary_format (str): Summary format the user picked, if any
+        count_pdf (bool): Whether to add the PDF to the monthly count; off
+            when it was already reserved with reserve_pdf_quota
+    """
+    usage = user.get_current_monthly_usage()
+    
+    upload = Upload(
+        user_id=user.id,
+        filename=filename,
+        page_count=page_count,
+        token_count=token_count,
+        document_type=document_type,
+        summary_format=summary_format
+    )
+    
+    # The Upload row and both counters are written in one transaction,
+    # with the counters bumped by a single atomic UPDATE
+    db.session.add(upload)
+    usage.add_usage(pdfs=1 if count_pdf else 0, tokens=token_count)
+    db.session.flush()
+    DailyUsage.record(upload)
+    db.session.commit()
+
+def reserve_pdf_quota(user, count):
+    """
+    Reserve part of a user's monthly PDF allowance up front.
+
+    Args:
+        user (User): The user processing PDFs
+        count (int): How many PDFs to reserve
+
+    Returns:
+        bool: True if the whole count fit and was reserved
+    """
+    usage = user.get_current_monthly_usage()
+    # Check and increment in one conditional UPDATE, so concurrent batches
+    # cannot both pass the check and overshoot the limit
+    reserved = usage.reserve_pdfs(count, user.get_monthly_pdf_limit())
+    db.session.commit()
+    return reserved
+
+def release_pdf_quota(user, count=1):
+    """Give back PDFs reserved with reserve_pdf_quota that were not processed"""
+    usage = user.get_current_monthly_usage()
+    usage.release_pdfs(count)
+    db.session.commit()
+
+def get_request_token_count(document):
+    """
+    Get the tokens the current request's PDF cost.
+    
+    Uses the prompt and completion usage the LLM reported when the request
+    summarized the document (g.token_usage), and otherwise the document's
+    extracted text counted with the tokenizer.
+    """
+    token_usage = g.get('token_usage')
+    if token_usage is not None and token_usage.calls:
+        return token_usage.total_tokens
+    if document is None:
+        return 0
+    # Count the text the request already extracted; incomplete extractions
+    # are never cached, so extracting again would parse the PDF again
+    extraction = document.extraction or extract_pages(document)
+    return count_tokens(extraction.text)
+
 def track_pdf_usage(document_type, summary_format):
     """
     Decorator to track PDF usage after successful processing
@@ -139,34 +283,22 @@ def track_pdf_usage(document_type, summary_format):
             result = f(*args, **kwargs)
             
             # After successful processing, update usage statistics
-            if hasattr(request, 'page_count') and hasattr(request, 'temp_pdf_path'):
-                # Get or create current monthly usage
-                usage = current_user.get_current_monthly_usage()
-                
-                # Increment PDF count
-                usage.increment_pdf_count()
+            if hasattr(request, 'page_count') and hasattr(request, 'pdf_upload'):
+                # Reuse the document parsed earlier in the request
+                document = get_request_document()
+                page_count = document.page_count if document else request.page_count
                 
-                # Estimate token count (very rough estimate)
-                # In a real app, you would get this from the AI service response
-                estimated_tokens = request.page_count * 500  # Rough estimate
-                
-                # Create upload record
-                upload = Upload(
-                    user_id=current_user.id,
-                    filename=os.path.basename(request.temp_pdf_path),
-                    page_count=request.page_count,
-                    token_count=estimated_tokens,
-                    document_type=document_type,
-                    summary_format=summary_format
+                record_usage(
+                    current_user,
+                    filename=request.pdf_upload.filename,
+                    page_count=page_count,
+                    token_count=get_request_token_count(document),
+                    document_type=document_type() if callable(document_type) else document_type,
+                    summary_format=summary_format() if callable(summary_format) else summary_format
                 )
                 
-                db.session.add(upload)
-                usage.add_token_usage(estimated_tokens)
-                db.session.commit()
-                
-                # Clean up temp file
-                if os.path.exists(request.temp_pdf_path):
-                    os.remove(request.temp_pdf_path)
+                # Release the upload's buffers
+                close_request_document()
             
             return result
         return decorated_function
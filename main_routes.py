@@ -1,13 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app, g, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 import uuid
+import json
+import time
 from extensions import db, login_manager
 from models.user import User
-from utils.pdf_processor import extract_text_from_pdf
-from utils.summarizer import generate_summary
-from datetime import datetime
+from models.summary import Summary
+from utils.pdf_processor import extract_pages, ExtractionResult, get_extraction_workers
+from utils.text_cleaner import normalize_pages
+from utils.extraction_cache import get_extraction_cache
+from utils.summary_cache import get_summary_cache
+from utils.llm_backends import get_llm_backend
+from decorators import open_request_document, ingest_request_upload, limit_upload_size, record_usage
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils.summarizer import stream_summary
+from utils.condenser import get_condense_budget
+from utils.document_store import get_document_store
+from utils.token_counter import TokenUsage
+from utils.jobs import get_job_manager, current_job, QUEUED, RUNNING, DONE, FAILED
+from utils.scheduler import get_scheduler
 import os
 from oauth import setup_oauth
 from authlib.integrations.flask_client import OAuth
@@ -16,6 +28,20 @@ import logging
 main_bp = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+# Longest a summary stream stays silent before sending a keep-alive
+SSE_HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT_INTERVAL', 15))
+
+# How often a stream checks on a summary running in another worker
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 0.5))
+
+# Streams end after this many seconds and the browser reconnects, so a sync
+# worker is never held past gunicorn's timeout (30 seconds by default)
+SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', 20))
+
+def _current_plan():
+    """Plan that sets the visitor's processing priority; anonymous visitors are free tier"""
+    return current_user.plan_type if current_user.is_authenticated else 'free'
+
 # Initialize OAuth
 oauth = OAuth()
 
@@ -48,6 +74,24 @@ def run_migration():
     
     return "Migration completed successfully"
 
+@main_bp.route('/manage/stats', methods=['GET'])
+def processing_stats():
+    """Report cache counters for measuring processing savings."""
+    token = os.environ.get('MIGRATION_SECRET_TOKEN')
+    if not token or request.args.get('token') != token:
+        return "Unauthorized", 401
+    
+    return jsonify({
+        'extraction_cache': get_extraction_cache().stats(),
+        'summary_cache': get_summary_cache().stats(),
+        'document_store': get_document_store().stats(),
+        'llm': get_llm_backend().stats(),
+        'scheduler': {
+            'extract': get_scheduler('extract', get_extraction_workers()).stats(),
+            'summarize': get_job_manager().scheduler.stats()
+        }
+    })
+
 @login_manager.user_loader
 def load_user(user_id):
     # Load user directly from the database using SQLAlchemy
@@ -59,6 +103,7 @@ def index():
     return render_template('index.html')
 
 @main_bp.route('/upload_pdf', methods=['POST'])
+@limit_upload_size
 def upload_pdf():
     # Check if a file was uploaded
     if 'pdf_file' not in request.files:
@@ -77,30 +122,35 @@ def upload_pdf():
         flash('Only PDF files are allowed', 'error')
         return redirect(url_for('main.index'))
     
-    # Check file size for free tier (if not logged in or no premium)
-    if not current_user.is_authenticated:
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > current_app.config['FREE_TIER_MAX_SIZE']:
-            flash('File size exceeds the free tier limit (5MB). Please upgrade or upload a smaller file.', 'error')
-            return redirect(url_for('main.index'))
+    # Read the upload once: hash, sniff and spool it without a named temp file
+    upload = ingest_request_upload(file)
+    filename = upload.filename
     
-    # Save the file
-    filename = secure_filename(file.filename)
-    temp_id = str(uuid.uuid4())
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{temp_id}_{filename}")
-    file.save(file_path)
+    if not upload.is_pdf:
+        flash('Only PDF files are allowed', 'error')
+        return redirect(url_for('main.index'))
     
     try:
-        # Extract text from PDF
-        text = extract_text_from_pdf(file_path)
+        # Extract text from PDF (large files are split across worker processes)
+        document = open_request_document(upload)
+        # Wait for an extraction slot; paid plans are admitted first
+        with get_scheduler('extract', get_extraction_workers()).slot(_current_plan()):
+            extraction = extract_pages(document)
+        if extraction.failed_pages:
+            logger.warning(f"Could not extract pages {sorted(extraction.failed_pages)} of {filename}")
+        if extraction.timed_out_pages or extraction.skipped_pages:
+            logger.warning(f"Extraction time budget exceeded for {filename}: "
+                           f"pages {extraction.timed_out_pages} timed out, "
+                           f"{len(extraction.skipped_pages)} pages skipped")
+        
+        # Drop running headers/footers and tidy whitespace before summarization
+        pages, cleanup = normalize_pages(extraction.pages)
+        text = ExtractionResult(pages).text
+        logger.info(f"Normalized {filename}: removed {cleanup.removed_lines} boilerplate lines, "
+                    f"saved ~{cleanup.tokens_saved} tokens")
         
-        # Store in session for later use
-        session['pdf_text'] = text
-        session['pdf_filename'] = filename
-        session['pdf_path'] = file_path
+        # Keep the text server-side; the session cookie only carries its ID
+        session['pdf_document_id'] = get_document_store().put(text, filename, document.page_count)
         
         # If user is logged in, generate summary immediately
         if current_user.is_authenticated:
@@ -113,29 +163,59 @@ def upload_pdf():
     except Exception as e:
         logger.error(f"Error processing PDF: {str(e)}")
         flash('Error processing PDF. Please try again with a different file.', 'error')
-        # Clean up the file
-        if os.path.exists(file_path):
-            os.remove(file_path)
         return redirect(url_for('main.index'))
 
+@main_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit_mb = g.get('upload_size_limit', current_app.config['FREE_TIER_MAX_SIZE']) // (1024 * 1024)
+    flash(f'File size exceeds your upload limit ({limit_mb}MB). Please upgrade or upload a smaller file.', 'error')
+    return render_template('index.html'), 413
+
 @main_bp.route('/summary/<summary_id>')
 @login_required
 def summary(summary_id):
+    # A job lost with its worker is reported as failed rather than pending forever
+    Summary.fail_stale(id=summary_id, user_id=current_user.id)
+    summary_record = db.session.get(Summary, summary_id)
+    
     # Check if summary exists
-    if summary_id not in summaries_db:
+    if summary_record is None:
         flash('Summary not found', 'error')
         return redirect(url_for('main.index'))
     
     # Check if summary belongs to user
-    summary_data = summaries_db[summary_id]
-    if summary_data['user_id'] != current_user.id:
+    if summary_record.user_id != current_user.id:
         flash('Unauthorized access', 'error')
         return redirect(url_for('main.index'))
     
+    # A summary still being generated is shown as pending and polled
+    if summary_record.status == FAILED:
+        flash(summary_record.error or 'Error generating summary. Please try again.', 'error')
+        return redirect(url_for('main.index'))
+    if summary_record.status != DONE:
+        return render_template('summary.html',
+                              filename=summary_record.filename,
+                              pending=True,
+                              status_url=url_for('main.summary_status', summary_id=summary_id))
+    
     return render_template('summary.html', 
-                          filename=summary_data['filename'],
-                          summary=summary_data['summary'],
-                          created_at=summary_data['created_at'])
+                          filename=summary_record.filename,
+                          summary=summary_record.text,
+                          created_at=summary_record.created_at)
+
+@main_bp.route('/summary/<summary_id>/status')
+@login_required
+def summary_status(summary_id):
+    """Report the progress of a background summary for the summary page to poll."""
+    Summary.fail_stale(id=summary_id, user_id=current_user.id)
+    # Only the status columns are read; the summary body stays unloaded
+    record = db.session.query(Summary.user_id, Summary.filename, Summary.status, Summary.error) \
+        .filter_by(id=summary_id).first()
+    if record is None or record.user_id != current_user.id:
+        return jsonify({'error': 'Summary not found'}), 404
+    
+    return jsonify({'id': summary_id, 'label': record.filename,
+                    'status': record.status, 'error': record.error})
 
 @main_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -171,7 +251,7 @@ def login():
             login_user(user)
             
             # Check if there's a pending PDF in session
-            if 'pdf_text' in session:
+            if 'pdf_document_id' in session:
                 return redirect(url_for('main.preview_to_summary'))
             
             return redirect(url_for('main.index'))
@@ -222,7 +302,7 @@ def google_callback():
         login_user(user)
         
         # Check if there's a pending PDF in session
-        if 'pdf_text' in session:
+        if 'pdf_document_id' in session:
             return redirect(url_for('main.preview_to_summary'))
         
         return redirect(url_for('main.index'))
@@ -306,49 +386,114 @@ def reset_test_data():
 def post_login():
     """Handle post-login actions."""
     # Check if there's a pending PDF in session
-    if 'pdf_text' in session:
+    if 'pdf_document_id' in session:
         return redirect(url_for('main.preview_to_summary'))
     
     return redirect(url_for('main.dashboard'))
 
+def _save_summary(summary_id, text, summary, token_usage):
+    """Store a finished summary and count it, with its actual token usage, against the user."""
+    # Store summary; it is committed along with the usage records
+    summary_record = db.session.get(Summary, summary_id)
+    summary_record.text = summary
+    summary_record.status = DONE
+    summary_record.token_count = token_usage.recorded_tokens(text)
+    
+    # Track usage
+    record_usage(summary_record.user, summary_record.filename, summary_record.page_count,
+                 summary_record.token_count)
+
+def _fail_summary(summary_id):
+    """Mark a summary failed so every worker reports it; nothing is counted"""
+    db.session.rollback()
+    summary_record = db.session.get(Summary, summary_id)
+    summary_record.status = FAILED
+    summary_record.error = 'Error generating summary. Please try again.'
+    db.session.commit()
+
+def _summarize_document(summary_id, document_id):
+    """
+    Summarize an uploaded document and record its usage; runs as a background job.
+
+    The summary is published to the job as the model writes it, for
+    summary_stream to relay. The stored document is only deleted once the
+    summary is saved, so a failed job never loses the user's upload.
+    """
+    summary_record = db.session.get(Summary, summary_id)
+    summary_record.status = RUNNING
+    db.session.commit()
+    
+    # Generate summary, tallying the tokens the model actually billed. On
+    # errors the summary is marked failed and nothing is counted.
+    token_usage = TokenUsage()
+    try:
+        document = get_document_store().get(document_id)
+        if document is None:
+            raise ValueError('The uploaded document has expired')
+        job = current_job()
+        stream = stream_summary(document.text, usage=token_usage,
+                                condense_tokens=get_condense_budget(summary_record.user.plan_type))
+        while True:
+            try:
+                job.publish(next(stream))
+            except StopIteration as stop:
+                summary = stop.value
+                break
+        _save_summary(summary_id, document.text, summary, token_usage)
+    except Exception:
+        _fail_summary(summary_id)
+        raise
+    get_document_store().delete(document_id)
+    return summary_id
+
+def _sse(event, data, event_id=None):
+    """Format one Server-Sent Event with a JSON payload and, optionally, an ID to resume after"""
+    event_id = '' if event_id is None else f"id: {event_id}\n"
+    return f"{event_id}event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @main_bp.route('/preview_to_summary')
 @login_required
 def preview_to_summary():
     try:
-        # Get the stored PDF data from session
-        if not all(key in session for key in ['pdf_text', 'pdf_filename', 'pdf_path']):
+        # Get the PDF the session points to from the document store
+        document = get_document_store().get(session.get('pdf_document_id'))
+        if document is None:
             flash('No PDF data found. Please upload your PDF again.', 'error')
             return redirect(url_for('main.index'))
         
-        text = session['pdf_text']
-        filename = session['pdf_filename']
-        file_path = session['pdf_path']
+        filename = document.filename
         
         # Check usage limit
-        if check_usage_limit(current_user.id):
-            flash('You have reached your daily limit of 3 summaries. Please upgrade for unlimited summaries.', 'warning')
+        if not current_user.can_upload_pdf():
+            flash(f'You have reached your monthly PDF limit for your {current_user.plan_type.capitalize()} plan. Please upgrade for more summaries.', 'warning')
             return redirect(url_for('main.index'))
         
-        # Generate summary
-        summary = generate_summary(text)
-        
-        # Track usage
-        track_usage(current_user.id)
-        
-        # Store summary
+        # Summarize in the background so this worker is free for other requests;
+        # the queued row lets any worker report the job's progress
         summary_id = str(uuid.uuid4())
-        summaries_db[summary_id] = {
-            'user_id': current_user.id,
-            'filename': filename,
-            'summary': summary,
-            'created_at': datetime.now()
-        }
+        db.session.add(Summary(id=summary_id, user_id=current_user.id, filename=filename,
+                               page_count=document.page_count, text='', status=QUEUED))
+        db.session.commit()
+        get_job_manager().submit(
+            _summarize_document,
+            summary_id, document.id,
+            app=current_app._get_current_object(),
+            job_id=summary_id,
+            user_id=current_user.id,
+            label=filename,
+            plan=_current_plan()
+        )
+        
+        # The job deletes the stored text once the summary is saved
+        session.pop('pdf_document_id', None)
         
-        # Clean up the file and session
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        for key in ['pdf_text', 'pdf_filename', 'pdf_path']:
-            session.pop(key, None)
+        # Browsers with EventSource watch the summary being written
+        if not request.args.get('background'):
+            return render_template('summary.html',
+                                  filename=filename,
+                                  streaming=True,
+                                  stream_url=url_for('main.summary_stream', summary_id=summary_id),
+                                  fallback_url=url_for('main.summary', summary_id=summary_id))
         
         return redirect(url_for('main.summary', summary_id=summary_id))
     except Exception as e:
@@ -356,4 +501,78 @@ def preview_to_summary():
         flash('Error generating summary. Please try again.', 'error')
         return redirect(url_for('main.index'))
 
+@main_bp.route('/summary/<summary_id>/stream')
+@login_required
+def summary_stream(summary_id):
+    """
+    Relay a summary job's output to the summary page as Server-Sent Events.
+
+    The job runs on the background workers, so this request only waits on
+    it, sending a keep-alive comment whenever nothing has arrived for
+    SSE_HEARTBEAT_INTERVAL seconds. Each chunk's ID is the number of chunks
+    sent so far; the stream ends after SSE_MAX_DURATION seconds and the
+    browser reconnects with the last ID it received (Last-Event-ID) to
+    resume. A job running in another worker process is followed through its
+    Summary row instead, and its text is sent in one piece when it is done.
+    """
+    record = db.session.query(Summary.user_id).filter_by(id=summary_id).first()
+    if record is None or record.user_id != current_user.id:
+        return Response(_sse('failed', {'message': 'Summary not found'}),
+                        mimetype='text/event-stream')
+    
+    job = get_job_manager().get(summary_id)
+    done = {'summary_id': summary_id, 'url': url_for('main.summary', summary_id=summary_id)}
+    try:
+        position = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        position = 0
+    
+    def events():
+        nonlocal position
+        deadline = time.time() + SSE_MAX_DURATION
+        # Send a byte straight away so proxies see the stream is alive, and
+        # have the browser reconnect promptly when the stream ends
+        yield f': connected\nretry: {int(SSE_POLL_INTERVAL * 1000)}\n\n'
+        quiet_since = time.time()
+        error = None
+        if job is not None:
+            for delta in job.follow(SSE_POLL_INTERVAL, start=position):
+                if delta is not None:
+                    position += 1
+                    yield _sse('chunk', {'text': delta}, event_id=position)
+                    quiet_since = time.time()
+                elif time.time() - quiet_since >= SSE_HEARTBEAT_INTERVAL:
+                    yield ': keep-alive\n\n'
+                    quiet_since = time.time()
+                if time.time() >= deadline:
+                    return
+            status = job.status
+        else:
+            while True:
+                # A job lost with its worker is failed instead of waited on forever
+                Summary.fail_stale(id=summary_id)
+                status, error = db.session.query(Summary.status, Summary.error).filter_by(id=summary_id).one()
+                db.session.rollback()
+                if status in (DONE, FAILED) or time.time() >= deadline:
+                    break
+                if time.time() - quiet_since >= SSE_HEARTBEAT_INTERVAL:
+                    yield ': keep-alive\n\n'
+                    quiet_since = time.time()
+                time.sleep(SSE_POLL_INTERVAL)
+            if status not in (DONE, FAILED):
+                return
+            if status == DONE:
+                # Replaces any chunks an earlier connection received
+                yield _sse('summary', {'text': db.session.get(Summary, summary_id).text})
+        
+        if status == DONE:
+            yield _sse('done', done)
+        else:
+            yield _sse('failed', {'message': error or 'Error generating summary. Please try again.'})
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Continue for all other routes...
\ No newline at end of file
@@ -1,8 +1,9 @@
 from models.db import db
 from models.user import User
-from models.usage import MonthlyUsage, Upload
+from models.usage import MonthlyUsage, Upload, DailyUsage
+from models.summary import Summary
 
 # This file ensures proper imports for the models package
 # Import this file to get access to all models
 
-__all__ = ['db', 'User', 'MonthlyUsage', 'Upload']
+__all__ = ['db', 'User', 'MonthlyUsage', 'Upload', 'DailyUsage', 'Summary']
@@ -1,5 +1,3 @@
-from flask_sqlalchemy import SQLAlchemy
-
-# Initialize SQLAlchemy instance
+# Re-export the application's SQLAlchemy instance (initialized in create_app)
 # This file should be imported by all models
-db = SQLAlchemy()
+from extensions import db
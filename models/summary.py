@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timedelta
+from extensions import db
+from models.types import CompressedText
+from utils.jobs import DONE, FAILED, JOB_STALE_AFTER
+
+# Error reported for a job whose worker stopped reporting it alive
+INTERRUPTED_ERROR = 'Summary job was interrupted. Please try again.'
+
+
+class Summary(db.Model):
+    """
+    A summary and the progress of the job generating it, stored so any
+    worker can report on it and serve it.
+
+    The row is written when the job is queued; text stays empty until
+    status reaches done.
+    """
+
+    __table_args__ = (
+        # Listing a user's summaries newest first is an index range scan
+        db.Index('ix_summary_user_id_created_at', 'user_id', 'created_at'),
+        # A batch's items are read together, in upload order
+        db.Index('ix_summary_batch_id_batch_index', 'batch_id', 'batch_index'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    page_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=DONE, server_default=DONE)
+    error = db.Column(db.String(255))
+    token_count = db.Column(db.Integer)
+    # Last time the process running the job reported it alive
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Set for files uploaded together through /pdf/batch
+    batch_id = db.Column(db.String(36))
+    batch_index = db.Column(db.Integer)
+
+    # Compressed summary text, only loaded when the summary is displayed
+    text = db.deferred(db.Column('body', CompressedText, nullable=False))
+
+    @classmethod
+    def beat(cls, summary_ids):
+        """Record that the jobs for these summaries are still queued or running in this process"""
+        (cls.query.filter(cls.id.in_(summary_ids), cls.status.notin_((DONE, FAILED)))
+         .update({cls.heartbeat_at: datetime.utcnow()}, synchronize_session=False))
+        db.session.commit()
+
+    @classmethod
+    def fail_stale(cls, max_age=JOB_STALE_AFTER, **filters):
+        """
+        Fail unfinished summaries whose job has stopped sending heartbeats.
+
+        A job lives only in the memory of the process that queued it, so if
+        that process dies its row would otherwise stay queued or running
+        forever. Batch items also give back the PDF they reserved.
+
+        Args:
+            max_age (float): Seconds without a heartbeat before a job is lost
+            **filters: Column values limiting which summaries are checked,
+                e.g. id or batch_id
+
+        Returns:
+            int: The number of summaries failed
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        stale = (cls.query.filter_by(**filters)
+                 .filter(cls.status.notin_((DONE, FAILED)),
+                         db.func.coalesce(cls.heartbeat_at, cls.created_at) < cutoff)
+                 .all())
+        if not stale:
+            return 0
+        failed = 0
+        for summary in stale:
+            # Only the worker whose update wins fails the row, so quota is released once
+            result = db.session.execute(
+                db.update(cls)
+                .where(cls.id == summary.id, cls.status == summary.status)
+                .values(status=FAILED, error=INTERRUPTED_ERROR)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount and summary.batch_id is not None:
+                summary.user.get_current_monthly_usage().release_pdfs(1)
+            failed += result.rowcount
+        db.session.commit()
+        return failed
@@ -0,0 +1,21 @@
+from extensions import db
+from utils.storage_codec import compress_text, decompress_text
+
+
+class CompressedText(db.TypeDecorator):
+    """
+    Text column stored compressed with the configured storage codec.
+
+    Rows written with any codec, or before compression, stay readable.
+    Declare the column deferred so it is only loaded, and decompressed,
+    when the attribute is read.
+    """
+
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
@@ -1,7 +1,77 @@
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql, sqlite
 # In models/user.py and models/usage.py
 from extensions import db
 
+# Whether record_usage maintains the DailyUsage rollup table
+DAILY_USAGE_ROLLUP = os.environ.get('DAILY_USAGE_ROLLUP', 'true').lower() == 'true'
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class Upload(db.Model):
+    __table_args__ = (
+        # Covers daily and per-user token sums: the range scan on
+        # (user_id, upload_date) reads token_count from the index itself
+        db.Index('ix_upload_user_id_upload_date', 'user_id', 'upload_date', 'token_count'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    page_count = db.Column(db.Integer, nullable=False)
+    token_count = db.Column(db.Integer, default=0)
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    document_type = db.Column(db.String(50))  # academic, business, legal, healthcare, finance, tech
+    summary_format = db.Column(db.String(50))  # plain_text, interactive, todo_list, visual, flowchart
+
+
+class DailyUsage(db.Model):
+    """Tokens a user spent per day, kept up to date as uploads are recorded."""
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    token_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def record(cls, upload):
+        """
+        Add a flushed upload's tokens to its day's total, without committing.
+        
+        A day's row starts from the SQL sum of that day's uploads (including
+        this one), so enabling the rollup mid-day still gives exact totals;
+        afterwards each upload is one upsert. Does nothing when
+        DAILY_USAGE_ROLLUP is off.
+        """
+        if not DAILY_USAGE_ROLLUP:
+            return
+        
+        day = upload.upload_date.date()
+        start_of_day = datetime.combine(day, datetime.min.time())
+        seed = (db.select(db.func.coalesce(db.func.sum(Upload.token_count), 0))
+                .where(Upload.user_id == upload.user_id,
+                       Upload.upload_date >= start_of_day,
+                       Upload.upload_date < start_of_day + timedelta(days=1))
+                .scalar_subquery())
+        
+        dialect = db.session.get_bind().dialect.name
+        if dialect in _UPSERT_INSERTS:
+            statement = _UPSERT_INSERTS[dialect](cls).values(user_id=upload.user_id, day=day, token_count=seed)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'day'],
+                set_={'token_count': cls.token_count + upload.token_count}))
+            return
+        
+        updated = db.session.execute(
+            db.update(cls)
+            .where(cls.user_id == upload.user_id, cls.day == day)
+            .values(token_count=cls.token_count + upload.token_count)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.session.execute(db.insert(cls).values(user_id=upload.user_id, day=day, token_count=seed))
+
 
 class MonthlyUsage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,14 +81,58 @@ class MonthlyUsage(db.Model):
     pdf_count = db.Column(db.Integer, default=0)
     token_count = db.Column(db.Integer, default=0)
     
+    def add_usage(self, pdfs=0, tokens=0):
+        """
+        Add to the month's counters in one atomic UPDATE, without committing.
+        
+        The increment happens in SQL (pdf_count = pdf_count + :pdfs), so
+        concurrent workers never overwrite each other's counts. The caller
+        commits, together with the rest of what it records.
+        """
+        db.session.execute(
+            db.update(MonthlyUsage)
+            .where(MonthlyUsage.id == self.id)
+            .values(pdf_count=MonthlyUsage.pdf_count + pdfs,
+                    token_count=MonthlyUsage.token_count + tokens)
+            .execution_options(synchronize_session=False)
+        )
+        # Reload the counters from the row the next time they are read
+        db.session.expire(self, ['pdf_count', 'token_count'])
+    
+    def reserve_pdfs(self, count, limit):
+        """
+        Atomically add count PDFs if the total stays within limit, without committing.
+        
+        Returns:
+            bool: True if the PDFs were reserved
+        """
+        result = db.session.execute(
+            db.update(MonthlyUsage)
+            .where(MonthlyUsage.id == self.id, MonthlyUsage.pdf_count + count <= limit)
+            .values(pdf_count=MonthlyUsage.pdf_count + count)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(self, ['pdf_count'])
+        return result.rowcount == 1
+    
+    def release_pdfs(self, count):
+        """Atomically give back reserved PDFs, never going below zero, without committing"""
+        db.session.execute(
+            db.update(MonthlyUsage)
+            .where(MonthlyUsage.id == self.id)
+            .values(pdf_count=db.case((MonthlyUsage.pdf_count > count, MonthlyUsage.pdf_count - count), else_=0))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(self, ['pdf_count'])
+    
     def increment_pdf_count(self):
         """Increment PDF count for the month"""
-        self.pdf_count += 1
+        self.add_usage(pdfs=1)
         db.session.commit()
     
     def add_token_usage(self, tokens):
         """Add token usage"""
-        self.token_count += tokens
+        self.add_usage(tokens=tokens)
         db.session.commit()
     
     def get_daily_token_usage(self, date=None):
@@ -26,25 +140,16 @@ class MonthlyUsage(db.Model):
         if date is None:
             date = datetime.utcnow().date()
         
-        # Get all uploads for this day
-        start_of_day = datetime.combine(date, datetime.min.time())
-        end_of_day = datetime.combine(date, datetime.max.time())
+        # One primary-key lookup when the day has been rolled up
+        if DAILY_USAGE_ROLLUP:
+            total = db.session.query(DailyUsage.token_count).filter_by(user_id=self.user_id, day=date).scalar()
+            if total is not None:
+                return total
         
-        uploads = Upload.query.filter(
+        # Otherwise sum in SQL over the (user_id, upload_date) index
+        start_of_day = datetime.combine(date, datetime.min.time())
+        return db.session.query(db.func.coalesce(db.func.sum(Upload.token_count), 0)).filter(
             Upload.user_id == self.user_id,
             Upload.upload_date >= start_of_day,
-            Upload.upload_date <= end_of_day
-        ).all()
-        
-        return sum(upload.token_count for upload in uploads)
-
-
-class Upload(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    filename = db.Column(db.String(255), nullable=False)
-    page_count = db.Column(db.Integer, nullable=False)
-    token_count = db.Column(db.Integer, default=0)
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    document_type = db.Column(db.String(50))  # academic, business, legal, healthcare, finance, tech
-    summary_format = db.Column(db.String(50))  # plain_text, interactive, todo_list, visual, flowchart
+            Upload.upload_date < start_of_day + timedelta(days=1)
+        ).scalar()
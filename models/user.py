@@ -24,6 +24,7 @@ class User(UserMixin, db.Model):
     # Relationships to usage tracking models
     monthly_usage = db.relationship('MonthlyUsage', backref='user', lazy=True)
     uploads = db.relationship('Upload', backref='user', lazy=True)
+    summaries = db.relationship('Summary', backref='user', lazy=True)
     
     def get_current_monthly_usage(self):
         """Get or create the current month's usage record"""
@@ -52,18 +53,24 @@ class User(UserMixin, db.Model):
             
         return usage
     
+    def get_monthly_pdf_limit(self):
+        """Get the number of PDFs allowed per month based on plan"""
+        if self.plan_type == "free":
+            return 5
+        elif self.plan_type == "starter":
+            return 50
+        elif self.plan_type == "pro":
+            return 100
+        return 5  # Default fallback
+    
+    def get_remaining_pdfs(self):
+        """Get how many more PDFs the user can process this month"""
+        usage = self.get_current_monthly_usage()
+        return max(0, self.get_monthly_pdf_limit() - usage.pdf_count)
+    
     def can_upload_pdf(self):
         """Check if user can upload more PDFs this month based on plan limits"""
-        usage = self.get_current_monthly_usage()
-        
-        if self.plan_type == "free" and usage.pdf_count >= 5:
-            return False
-        elif self.plan_type == "starter" and usage.pdf_count >= 50:
-            return False
-        elif self.plan_type == "pro" and usage.pdf_count >= 100:
-            return False
-            
-        return True
+        return self.get_remaining_pdfs() > 0
     
     def get_max_pages_per_file(self):
         """Get maximum pages allowed per file based on plan"""
@@ -75,6 +82,16 @@ class User(UserMixin, db.Model):
             return 30
         return 20  # Default fallback
     
+    def get_max_upload_size(self):
+        """Get maximum upload size in bytes based on plan"""
+        if self.plan_type == "free":
+            return 5 * 1024 * 1024
+        elif self.plan_type == "starter":
+            return 10 * 1024 * 1024
+        elif self.plan_type == "pro":
+            return 10 * 1024 * 1024
+        return 5 * 1024 * 1024  # Default fallback
+    
     def get_ai_model(self):
         """Get AI model to use based on plan"""
         if self.plan_type == "free":
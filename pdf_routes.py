@@ -1,14 +1,33 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app
 from flask_login import login_required, current_user
-from models import db, User, Upload, MonthlyUsage
-from decorators import plan_required, feature_required, check_upload_limits, check_page_limit, track_pdf_usage
+from werkzeug.exceptions import RequestEntityTooLarge
+from models import db, User, Upload, MonthlyUsage, Summary
+from decorators import (plan_required, feature_required, check_upload_limits, check_page_limit, track_pdf_usage,
+                        limit_upload_size, get_upload_size_limit, record_usage, reserve_pdf_quota, release_pdf_quota)
+from utils.uploads import ingest_upload
+from utils.pdf_processor import PdfDocument, extract_pages, ExtractionResult, get_extraction_workers
+from utils.text_cleaner import normalize_pages
+from utils.summarizer import summarize_text
+from utils.condenser import get_condense_budget
+from utils.token_counter import TokenUsage
+from utils.scheduler import get_scheduler
+from utils.jobs import get_job_manager
+from utils.batches import batch_to_dict, BATCH_MAX_FILES, QUEUED, EXTRACTING, SUMMARIZING, DONE, FAILED
+from sqlalchemy.orm import undefer
+import logging
+import uuid
 import os
 
 # Create blueprint for PDF processing
 pdf_bp = Blueprint('pdf', __name__)
+logger = logging.getLogger(__name__)
+
+# Cap on the whole body of a batch upload, on top of the per-file plan limit
+BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
 
 @pdf_bp.route('/upload', methods=['GET', 'POST'])
 @login_required
+@limit_upload_size
 @check_upload_limits
 @check_page_limit
 def upload_pdf():
@@ -45,16 +64,11 @@ def upload_pdf():
         # Check page limit based on user's plan
         max_pages = current_user.get_max_pages_per_file()
         
-        # Get page count from form data
-        page_count = request.form.get('page_count')
+        # Page count is read from the uploaded file itself by check_page_limit
+        page_count = getattr(request, 'page_count', None)
         if page_count is None:
             return jsonify({"error": "Could not determine PDF page count"}), 400
             
-        try:
-            page_count = int(page_count)
-        except ValueError:
-            return jsonify({"error": "Invalid page count"}), 400
-            
         if page_count > max_pages:
             return jsonify({"error": f"PDF exceeds {max_pages} page limit"}), 403
             
@@ -104,6 +118,185 @@ def process():
                           ai_model=ai_model,
                           priority=priority)
 
+@pdf_bp.route('/batch', methods=['POST'])
+@login_required
+def batch_upload():
+    """Accept many PDFs at once and summarize them in the background"""
+    # Lift the single-file body limit before the form is parsed; each file
+    # is still held to the plan's per-file limit while it is ingested
+    file_limit = get_upload_size_limit()
+    request.max_content_length = min(file_limit * BATCH_MAX_FILES, BATCH_MAX_CONTENT_LENGTH)
+    
+    document_type = request.form.get('document_type', 'academic')
+    if not current_user.can_access_feature(document_type):
+        return jsonify({"error": f"Your plan does not support {document_type} documents"}), 403
+    
+    summary_format = request.form.get('summary_format', 'plain_text')
+    if not current_user.can_access_feature(summary_format):
+        return jsonify({"error": f"Your plan does not support {summary_format} format"}), 403
+    
+    files = [f for f in request.files.getlist('pdf') if f and f.filename]
+    if not files:
+        return jsonify({"error": "No file provided"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"A batch can contain at most {BATCH_MAX_FILES} files"}), 400
+    
+    # Read every file once; files that are not usable PDFs fail individually.
+    # Each file becomes a Summary row so any worker can report its progress.
+    batch_id = str(uuid.uuid4())
+    items = [Summary(id=str(uuid.uuid4()), user_id=current_user.id, filename=file.filename,
+                     page_count=0, text='', status=QUEUED, batch_id=batch_id, batch_index=index)
+             for index, file in enumerate(files)]
+    uploads = {}
+    for item, file in zip(items, files):
+        if not file.filename.lower().endswith('.pdf'):
+            _fail_item(item, "Only PDF files are allowed")
+            continue
+        try:
+            upload = ingest_upload(file, max_size=file_limit)
+        except RequestEntityTooLarge:
+            _fail_item(item, f"File exceeds your upload limit ({file_limit // (1024 * 1024)}MB)")
+            continue
+        if not upload.is_pdf:
+            upload.close()
+            _fail_item(item, "Only PDF files are allowed")
+            continue
+        item.filename = upload.filename
+        uploads[item.id] = upload
+    
+    # One quota check for the whole batch, reserving every accepted file
+    if uploads and not reserve_pdf_quota(current_user, len(uploads)):
+        for upload in uploads.values():
+            upload.close()
+        remaining = current_user.get_remaining_pdfs()
+        return jsonify({"error": f"This batch needs {len(uploads)} PDFs but your plan has {remaining} left this month"}), 403
+    
+    db.session.add_all(items)
+    db.session.commit()
+    
+    # Pipeline: extraction and summarization each run on their own
+    # plan-aware scheduler, so one item can be summarized while the next
+    # is still being extracted. Both stages are background jobs, so a
+    # failure in either is logged.
+    plan = current_user.plan_type
+    max_pages = current_user.get_max_pages_per_file()
+    extract_scheduler = get_scheduler('extract', get_extraction_workers())
+    for summary_id, upload in uploads.items():
+        get_job_manager().submit(
+            _extract_batch_item,
+            summary_id, upload, max_pages, plan, document_type, summary_format,
+            app=current_app._get_current_object(),
+            job_id=summary_id,
+            user_id=current_user.id,
+            label=upload.filename,
+            plan=plan,
+            scheduler=extract_scheduler
+        )
+    
+    return jsonify({
+        "batch_id": batch_id,
+        "status_url": url_for('pdf.batch_status', batch_id=batch_id),
+        **batch_to_dict(batch_id, items)
+    }), 202
+
+@pdf_bp.route('/batch/<batch_id>')
+@login_required
+def batch_status(batch_id):
+    """Report per-file progress and results of a batch"""
+    # Items whose jobs were lost with their worker are failed, releasing their PDFs
+    Summary.fail_stale(batch_id=batch_id, user_id=current_user.id)
+    items = (Summary.query.options(undefer(Summary.text))
+             .filter_by(batch_id=batch_id, user_id=current_user.id)
+             .order_by(Summary.batch_index).all())
+    if not items:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(batch_to_dict(batch_id, items))
+
+def _fail_item(item, error):
+    """Mark a batch item failed with a user-facing reason"""
+    item.status = FAILED
+    item.error = error
+
+def _fail_batch_item(summary_id, error):
+    """
+    Fail a submitted batch item and give back the PDF it reserved.
+
+    Safe to call from any error handler: an item that already finished is
+    left alone, and if the database is unavailable the failure is only
+    logged.
+    """
+    try:
+        db.session.rollback()
+        item = db.session.get(Summary, summary_id)
+        if item is None or item.status in (DONE, FAILED):
+            return
+        _fail_item(item, error)
+        # Committed along with the quota, so a failed item never still holds its PDF
+        release_pdf_quota(item.user)
+    except Exception:
+        logger.exception(f"Could not mark batch item {summary_id} failed")
+        db.session.rollback()
+
+def _extract_batch_item(summary_id, upload, max_pages, plan, document_type, summary_format):
+    """Pipeline stage 1: extract and clean one file, then queue its summary; runs as a background job"""
+    try:
+        item = db.session.get(Summary, summary_id)
+        item.status = EXTRACTING
+        db.session.commit()
+        try:
+            with PdfDocument(upload) as document:
+                item.page_count = document.page_count
+                if item.page_count > max_pages:
+                    raise ValueError(f"PDF has {item.page_count} pages, but your plan only allows {max_pages} pages per file")
+                extraction = extract_pages(document)
+            pages, _ = normalize_pages(extraction.pages)
+            text = ExtractionResult(pages).text
+        except Exception as e:
+            # The file itself was unusable; that is the user's to fix, not ours
+            logger.warning(f"Batch {item.batch_id} item {item.batch_index} failed extraction: {str(e)}")
+            _fail_batch_item(summary_id, str(e) if isinstance(e, ValueError) else "Error processing PDF")
+            return
+        
+        item.status = SUMMARIZING
+        db.session.commit()
+        get_job_manager().submit(
+            _summarize_batch_item,
+            summary_id, text, document_type, summary_format,
+            app=current_app._get_current_object(),
+            job_id=summary_id,
+            user_id=item.user_id,
+            label=item.filename,
+            plan=plan
+        )
+    except Exception:
+        # Anything else (e.g. the database) would leave the item stuck
+        _fail_batch_item(summary_id, "Error processing PDF")
+        raise
+    finally:
+        upload.close()
+
+def _summarize_batch_item(summary_id, text, document_type, summary_format):
+    """Pipeline stage 2: summarize one file and record its usage; runs as a background job"""
+    try:
+        item = db.session.get(Summary, summary_id)
+        user = item.user
+        token_usage = TokenUsage()
+        summary = summarize_text(text, usage=token_usage,
+                                 document_type=document_type,
+                                 summary_format=summary_format,
+                                 condense_tokens=get_condense_budget(user.plan_type))
+        
+        # The PDF itself was counted when the batch reserved its quota;
+        # the summary is committed along with the usage records
+        item.text = summary
+        item.token_count = token_usage.recorded_tokens(text)
+        item.status = DONE
+        record_usage(user, item.filename, item.page_count, item.token_count,
+                     document_type, summary_format, count_pdf=False)
+    except Exception:
+        _fail_batch_item(summary_id, "Error generating summary")
+        raise
+
 # Helper functions for available features based on plan
 def get_available_document_types():
     """Get document types available for current user's plan"""
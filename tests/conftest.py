@@ -3,6 +3,7 @@ from flask import Flask, redirect, url_for, request, jsonify, session
 from flask_login import LoginManager, login_user, login_required, current_user, logout_user
 import os
 import sys
+import zlib
 import tempfile
 from sqlalchemy.orm import scoped_session, sessionmaker
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -15,6 +16,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from models import User
 from models import MonthlyUsage, Upload
 from extensions import login_manager, db
+import utils.summarizer as summarizer
+from utils.summary_cache import SummaryCache
 
 # Global variable for mocking page count in tests
 mock_page_count = None
@@ -328,6 +331,69 @@ def mock_pdf_file():
     # Clean up the temporary file
     os.unlink(temp_path)
 
+def build_pdf(page_texts, xref_stream=False):
+    """
+    Build a minimal PDF whose pages each draw one line of text.
+
+    With xref_stream, the cross-reference table is written as a PDF 1.5
+    compressed xref stream instead of a classic table.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in page_texts:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        content = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        content_num = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_num
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref_offset = len(out)
+    if xref_stream:
+        # Each entry: type (1 byte), offset (4 bytes), generation (2 bytes)
+        entries = b"\x00\x00\x00\x00\x00\xff\xff" + b"".join(
+            b"\x01" + offset.to_bytes(4, "big") + b"\x00\x00" for offset in offsets + [xref_offset])
+        stream = zlib.compress(entries)
+        out += b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R /Filter /FlateDecode /Length %d >>\n" \
+            % (len(objects) + 1, len(objects) + 2, len(stream))
+        out += b"stream\n" + stream + b"\nendstream\nendobj\n"
+        out += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+        return bytes(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+@pytest.fixture
+def pdf_factory(tmp_path):
+    """Write PDFs with the given per-page text to a temporary directory."""
+    def factory(page_texts, name="document.pdf", xref_stream=False):
+        path = tmp_path / name
+        path.write_bytes(build_pdf(page_texts, xref_stream))
+        return str(path)
+    return factory
+
+@pytest.fixture(autouse=True)
+def summary_cache(tmp_path, monkeypatch):
+    """Give each test its own empty summary cache instead of the shared one."""
+    cache = SummaryCache(path=str(tmp_path / 'summaries.sqlite3'))
+    monkeypatch.setattr(summarizer, 'get_summary_cache', lambda: cache)
+    return cache
+
 # Add an autouse fixture to ensure database is clean between tests
 @pytest.fixture(autouse=True)
 def cleanup_db(app, db_session):
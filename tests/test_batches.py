@@ -0,0 +1,56 @@
+from models import MonthlyUsage, Summary
+from decorators import reserve_pdf_quota, release_pdf_quota
+from utils.batches import batch_to_dict, QUEUED, DONE, FAILED, SUMMARIZING
+
+
+def make_items(filenames):
+    """Build unsaved batch item rows, as batch_upload does."""
+    return [Summary(user_id="user-1", filename=filename, page_count=0, text='', status=QUEUED,
+                    batch_id="batch-1", batch_index=index)
+            for index, filename in enumerate(filenames)]
+
+def test_batch_progress_counts_item_statuses():
+    """Test that a batch reports per-item progress until every item finishes."""
+    items = make_items(["a.pdf", "b.pdf", "c.pdf"])
+    items[0].status, items[0].text = DONE, "Summary of a"
+    items[1].status = SUMMARIZING
+    items[2].status, items[2].error = FAILED, "Only PDF files are allowed"
+
+    progress = batch_to_dict("batch-1", items)
+    assert progress["status"] == "processing"
+    assert progress["counts"] == {DONE: 1, SUMMARIZING: 1, FAILED: 1}
+    assert progress["items"][0]["summary"] == "Summary of a"
+    assert progress["items"][1]["summary"] is None
+    assert progress["items"][2]["error"] == "Only PDF files are allowed"
+
+    items[1].status = DONE
+    assert batch_to_dict("batch-1", items)["status"] == DONE
+
+def test_batch_items_are_stored_as_summaries(app, free_user, db_session):
+    """Test that a batch is read back from the summary table in upload order."""
+    with app.app_context():
+        items = make_items(["a.pdf", "b.pdf"])
+        for item in items:
+            item.user_id = free_user.id
+        db_session.add_all(reversed(items))
+        db_session.commit()
+
+        stored = (Summary.query.filter_by(batch_id="batch-1", user_id=free_user.id)
+                  .order_by(Summary.batch_index).all())
+
+        assert [item["filename"] for item in batch_to_dict("batch-1", stored)["items"]] == ["a.pdf", "b.pdf"]
+
+def test_batch_quota_is_reserved_up_front(app, free_user, db_session):
+    """Test that a batch reserves its PDFs at once and only if they all fit."""
+    with app.app_context():
+        user = db_session.merge(free_user)
+
+        assert not reserve_pdf_quota(user, 6)
+        assert reserve_pdf_quota(user, 4)
+        assert user.get_remaining_pdfs() == 1
+        assert not reserve_pdf_quota(user, 2)
+
+        # Items that fail give their reservation back
+        release_pdf_quota(user, 2)
+        usage = MonthlyUsage.query.filter_by(user_id=user.id).first()
+        assert usage.pdf_count == 2
@@ -0,0 +1,76 @@
+import pytest
+import utils.condenser as condenser
+from utils.condenser import condense_text, rank_sentences, get_condense_budget
+from utils.summarizer import generate_summary
+from utils.token_counter import count_tokens
+
+
+def report_text():
+    """A long report where every paragraph restates the same topic, plus off-topic asides."""
+    paragraphs = []
+    for i in range(40):
+        paragraphs.append(f"Quarterly revenue growth in region {i} came from enterprise customers. "
+                          f"Enterprise revenue growth beat the quarterly forecast in region {i}. "
+                          f"The office cafeteria served soup number {i}.")
+    return "\n\n".join(paragraphs)
+
+def test_central_sentences_rank_above_asides():
+    """Test that sentences sharing the document's main terms score highest."""
+    scores = rank_sentences(["Revenue growth beat the forecast.",
+                             "Revenue growth came from enterprise customers.",
+                             "Enterprise customers drove the forecast revenue.",
+                             "The cafeteria served soup."])
+
+    assert scores[3] == min(scores)
+
+def test_condensed_text_fits_budget_in_original_order():
+    """Test that the kept sentences fit the budget and keep document order."""
+    text = report_text()
+
+    report = condense_text(text, 300)
+
+    assert count_tokens(report.text) <= 300
+    assert report.compression_ratio < 0.5
+    assert report.sentences_after < report.sentences_before
+    assert "cafeteria" not in report.text
+    kept = [text.index(sentence) for sentence in report.text.replace("\n\n", " ").split(". ")]
+    assert kept == sorted(kept)
+
+def test_short_text_is_unchanged():
+    """Test that text already within budget is passed through."""
+    report = condense_text("One short sentence. And another.", 100)
+
+    assert report.text == "One short sentence. And another."
+    assert report.compression_ratio == 1.0
+
+@pytest.mark.skipif(condenser.numpy is None, reason="NumPy is not installed")
+def test_numpy_and_python_rankings_agree():
+    """Test that the vectorized ranking matches the pure-Python one."""
+    sentences = [sentence for _, sentence in condenser.split_sentences(report_text())]
+    rows, columns, values, terms = condenser._tfidf(sentences)
+
+    vectorized = condenser._rank_numpy(rows, columns, values, len(sentences), terms)
+    plain = condenser._rank_python(rows, columns, values, len(sentences), terms)
+
+    assert vectorized == pytest.approx(plain, abs=1e-6)
+
+def test_condensed_prompt_is_sent_to_model(monkeypatch):
+    """Test that generate_summary sends only the condensed text when a budget is set."""
+    prompts = []
+    monkeypatch.setattr('utils.summarizer._complete',
+                        lambda prompt, max_tokens, usage=None: prompts.append(prompt) or "summary")
+
+    generate_summary(report_text(), condense_tokens=300)
+
+    assert len(prompts) == 1
+    assert count_tokens(prompts[0]) < 400
+
+def test_condense_budget_per_plan(monkeypatch):
+    """Test that budgets come from the environment, with paid plans off by default."""
+    monkeypatch.delenv('SUMMARY_CONDENSE_TOKENS', raising=False)
+    assert get_condense_budget('free') == 2000
+    assert get_condense_budget('pro') is None
+
+    monkeypatch.setenv('SUMMARY_CONDENSE_TOKENS', 'free:0,starter:6000')
+    assert get_condense_budget('free') is None
+    assert get_condense_budget('starter') == 6000
@@ -0,0 +1,45 @@
+import time
+import pytest
+from utils.document_store import DocumentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A document store in a temporary file."""
+    store = DocumentStore(path=str(tmp_path / "documents.sqlite3"), ttl=60)
+    yield store
+    store.stop_sweeper()
+
+def test_document_round_trips_compressed(store):
+    """Test that stored text comes back intact and is stored compressed."""
+    text = "The quarterly report shows steady growth. " * 500
+
+    doc_id = store.put(text, "report.pdf", 12)
+    document = store.get(doc_id)
+
+    assert (document.text, document.filename, document.page_count) == (text, "report.pdf", 12)
+    stats = store.stats()
+    assert stats["raw_bytes"] == len(text)
+    assert stats["stored_bytes"] * 4 < stats["raw_bytes"]
+
+def test_unknown_and_deleted_documents_are_missing(store):
+    """Test that lookups of unknown or deleted IDs return None."""
+    doc_id = store.put("text", "a.pdf")
+    store.delete(doc_id)
+
+    assert store.get(doc_id) is None
+    assert store.get("unknown") is None
+    assert store.get(None) is None
+
+def test_expired_documents_are_hidden_and_swept(store):
+    """Test that expired documents are never returned and the sweeper removes them."""
+    store.ttl = 0.05
+    doc_id = store.put("text", "a.pdf")
+    time.sleep(0.06)
+
+    assert store.get(doc_id) is None
+    assert store.stats()["entries"] == 1
+
+    store.start_sweeper(interval=0.01)
+    time.sleep(0.1)
+    assert store.stats()["entries"] == 0
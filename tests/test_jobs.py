@@ -0,0 +1,107 @@
+import pytest
+import threading
+from flask import current_app
+from utils.jobs import JobManager, current_job, QUEUED, RUNNING, DONE, FAILED
+
+
+@pytest.fixture
+def job_manager():
+    """A job manager with two workers, shut down after the test."""
+    manager = JobManager(max_workers=2)
+    yield manager
+    manager.shutdown()
+
+def wait_for(job, timeout=5):
+    """Block until a job has finished."""
+    for _ in range(int(timeout / 0.01)):
+        if job.finished:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError(f"Job {job.id} did not finish")
+
+def test_submit_returns_before_work_finishes(job_manager):
+    """Test that submitting a job does not wait for it to run."""
+    release = threading.Event()
+
+    job = job_manager.submit(lambda: release.wait(5) and "summary", user_id="user-1")
+
+    assert job.status in (QUEUED, RUNNING)
+    assert job_manager.get(job.id) is job
+    release.set()
+    assert wait_for(job).status == DONE
+    assert job.result == "summary"
+    assert job.to_dict()["status"] == DONE
+
+def test_failed_job_records_error(job_manager):
+    """Test that an exception marks the job failed instead of escaping."""
+    def broken():
+        raise ValueError("model unavailable")
+
+    job = wait_for(job_manager.submit(broken))
+
+    assert job.status == FAILED
+    assert job.error == "model unavailable"
+
+def test_job_runs_in_app_context(app, job_manager):
+    """Test that jobs given an app can use current_app."""
+    job = wait_for(job_manager.submit(lambda: current_app.name, app=app))
+
+    assert job.status == DONE
+    assert job.result == app.name
+
+def test_expired_jobs_are_pruned():
+    """Test that finished jobs are forgotten after the result TTL."""
+    manager = JobManager(max_workers=1, result_ttl=0)
+    first = wait_for(manager.submit(lambda: 1, job_id="first"))
+
+    manager.submit(lambda: 2)
+
+    assert first.id == "first"
+    assert manager.get("first") is None
+    manager.shutdown()
+
+
+def test_followers_receive_published_updates(job_manager):
+    """Test that follow yields each update, a heartbeat while idle, then ends."""
+    release = threading.Event()
+
+    def work():
+        current_job().publish("first")
+        release.wait(5)
+        current_job().publish("second")
+
+    job = job_manager.submit(work)
+    updates = job.follow(timeout=0.05)
+
+    assert next(updates) == "first"
+    assert next(updates) is None
+    release.set()
+    assert [update for update in updates if update is not None] == ["second"]
+    assert job.status == DONE
+    # A late follower still sees everything the job published
+    assert list(job.follow(timeout=0.05)) == ["first", "second"]
+
+def test_heartbeat_reports_unfinished_jobs(job_manager):
+    """Test that the heartbeat names unfinished jobs, goes quiet once they finish and stops on shutdown."""
+    release = threading.Event()
+    beats = []
+    job = job_manager.submit(release.wait, 5, job_id="slow")
+
+    job_manager.start_heartbeat(beats.append, interval=0.01)
+    for _ in range(500):
+        if beats:
+            break
+        threading.Event().wait(0.01)
+    release.set()
+    wait_for(job)
+    first = beats[0]
+    # Let a beat taken just before the job finished land first
+    threading.Event().wait(0.05)
+    beats.clear()
+    threading.Event().wait(0.05)
+
+    assert first == ["slow"]
+    assert beats == []
+    job_manager.shutdown()
+    job_manager._heartbeat.join(1)
+    assert not job_manager._heartbeat.is_alive()
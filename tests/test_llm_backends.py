@@ -0,0 +1,180 @@
+import pytest
+import time
+import threading
+from types import SimpleNamespace
+import utils.llm_backends as llm_backends
+from utils.llm_backends import (LLMBackend, LocalBackend, OpenAIBackend, RetryingBackend,
+                                LLMBackendError, CompletionResult, create_llm_backend)
+from utils.summarizer import generate_summary, stream_summary
+from utils.token_counter import TokenUsage
+
+
+def document(sentences):
+    """A summarization prompt around the given number of sentences."""
+    body = " ".join(f"Finding number {i} concerns the regional sales figures." for i in range(sentences))
+    return [{"role": "system", "content": "You summarize."},
+            {"role": "user", "content": f"Summarize this:\n\n{body}"}]
+
+def test_local_backend_is_deterministic():
+    """Test that the same prompt always gets the same reply and usage."""
+    first = LocalBackend().complete(document(20), "gpt-3.5-turbo", 500)
+    second = LocalBackend().complete(document(20), "gpt-3.5-turbo", 500)
+
+    assert first.text == second.text
+    assert (first.prompt_tokens, first.completion_tokens) == (second.prompt_tokens, second.completion_tokens)
+
+def test_local_reply_length_scales_with_prompt():
+    """Test that longer prompts get longer replies, capped at max_tokens."""
+    backend = LocalBackend()
+
+    short = backend.complete(document(10), "gpt-3.5-turbo", 500)
+    long = backend.complete(document(100), "gpt-3.5-turbo", 500)
+    capped = backend.complete(document(100), "gpt-3.5-turbo", 30)
+
+    assert short.completion_tokens < long.completion_tokens
+    assert capped.completion_tokens <= 30
+
+def test_local_backend_simulates_latency_and_errors():
+    """Test that configured latency is applied and errors carry a status code."""
+    start = time.monotonic()
+    LocalBackend(latency=0.05).complete(document(5), "gpt-3.5-turbo", 100)
+    assert time.monotonic() - start >= 0.05
+
+    with pytest.raises(LLMBackendError) as error:
+        LocalBackend(error_rate=1.0).complete(document(5), "gpt-3.5-turbo", 100)
+    assert error.value.status_code == 503
+
+def test_openai_backend_reports_usage():
+    """Test that the OpenAI backend maps the SDK response and usage."""
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=" A summary. "))],
+        usage=SimpleNamespace(prompt_tokens=120, completion_tokens=15))
+    backend = OpenAIBackend(api_key="test")
+    backend._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: response)))
+
+    result = backend.complete(document(3), "gpt-3.5-turbo", 100)
+
+    assert result.text == "A summary."
+    assert (result.prompt_tokens, result.completion_tokens) == (120, 15)
+
+def test_backend_selected_from_environment(monkeypatch):
+    """Test that TESTING picks the local backend unless LLM_BACKEND overrides it."""
+    monkeypatch.delenv('LLM_BACKEND', raising=False)
+    monkeypatch.setenv('TESTING', 'true')
+    assert isinstance(create_llm_backend(), LocalBackend)
+
+    monkeypatch.setenv('LLM_BACKEND', 'openai')
+    assert isinstance(create_llm_backend(), OpenAIBackend)
+
+    with pytest.raises(ValueError):
+        create_llm_backend('unknown')
+
+def test_local_backend_tuned_from_environment(monkeypatch):
+    """Test that the local backend's settings, including its summary ratio, come from the environment."""
+    monkeypatch.setenv('LOCAL_LLM_ERROR_RATE', '0.5')
+    monkeypatch.setenv('LOCAL_LLM_SUMMARY_RATIO', '0.05')
+
+    backend = create_llm_backend('local')
+
+    assert (backend.error_rate, backend.summary_ratio) == (0.5, 0.05)
+
+def test_summary_runs_end_to_end_on_local_backend(monkeypatch):
+    """Test the full summarizer, including usage, against the stand-in."""
+    monkeypatch.setattr(llm_backends, '_default_backend', LocalBackend())
+    text = " ".join(f"Finding number {i} concerns the regional sales figures." for i in range(30))
+    usage = TokenUsage()
+
+    summary = generate_summary(text, usage=usage)
+
+    assert summary.startswith("Finding number 0")
+    assert usage.calls == 1
+    assert usage.completion_tokens > 0
+
+class FlakyBackend(LLMBackend):
+    """Fails with the given status codes, then succeeds."""
+
+    name = 'flaky'
+
+    def __init__(self, statuses, delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.calls = 0
+
+    def complete(self, messages, model, max_tokens, temperature=0.5):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.statuses:
+            raise LLMBackendError("upstream error", status_code=self.statuses.pop(0))
+        return CompletionResult("ok", 10, 1)
+
+def test_rate_limits_and_server_errors_are_retried():
+    """Test that 429 and 5xx responses are retried with backoff."""
+    backend = RetryingBackend(FlakyBackend([429, 503, None]), backoff_base=0.001)
+
+    result = backend.complete(document(1), "gpt-3.5-turbo", 10)
+
+    assert result.text == "ok"
+    assert backend.stats()["retries"] == 3
+    assert backend.stats()["failures"] == 0
+
+def test_client_errors_fail_without_retry():
+    """Test that a 400 is surfaced immediately."""
+    flaky = FlakyBackend([400])
+    backend = RetryingBackend(flaky, backoff_base=0.001)
+
+    with pytest.raises(LLMBackendError):
+        backend.complete(document(1), "gpt-3.5-turbo", 10)
+
+    assert flaky.calls == 1
+    assert backend.stats()["failures"] == 1
+
+def test_retries_give_up_after_max_retries():
+    """Test that persistent 5xx errors stop after max_retries."""
+    flaky = FlakyBackend([500] * 10)
+    backend = RetryingBackend(flaky, max_retries=2, backoff_base=0.001)
+
+    with pytest.raises(LLMBackendError):
+        backend.complete(document(1), "gpt-3.5-turbo", 10)
+
+    assert flaky.calls == 3
+
+def test_concurrency_is_capped():
+    """Test that no more than max_concurrency calls run at once."""
+    backend = RetryingBackend(FlakyBackend([], delay=0.02), max_concurrency=2)
+    threads = [threading.Thread(target=backend.complete, args=(document(1), "gpt-3.5-turbo", 10))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = backend.stats()
+    assert stats["peak_in_flight"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["calls"] == 6
+
+def test_stream_matches_complete_and_cost(monkeypatch):
+    """Test that streaming yields the same summary and usage as a blocking call."""
+    text = " ".join(f"Finding number {i} concerns the regional sales figures." for i in range(30))
+    monkeypatch.setattr(llm_backends, '_default_backend', LocalBackend())
+    blocking_usage, streamed_usage = TokenUsage(), TokenUsage()
+    deltas = []
+
+    stream = stream_summary(text, usage=streamed_usage, use_cache=False)
+    try:
+        while True:
+            deltas.append(next(stream))
+    except StopIteration as stop:
+        summary = stop.value
+
+    assert len(deltas) > 1
+    assert "".join(deltas) == summary == generate_summary(text, usage=blocking_usage, use_cache=False)
+    assert streamed_usage.total_tokens == blocking_usage.total_tokens
+
+def test_stream_retries_only_before_first_delta():
+    """Test that a stream failing before any output is retried."""
+    backend = RetryingBackend(FlakyBackend([503]), backoff_base=0.001)
+
+    assert list(backend.stream(document(1), "gpt-3.5-turbo", 10)) == ["ok"]
+    assert backend.stats()["retries"] == 1
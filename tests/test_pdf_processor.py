@@ -0,0 +1,324 @@
+import pytest
+import os
+import types
+import signal
+import mmap
+import time
+import hashlib
+import random
+import PyPDF2
+import utils.pdf_processor as pdf_processor
+from utils.pdf_processor import iter_pages, extract_pages, extract_text_from_pdf
+from utils.extraction_cache import ExtractionCache
+from conftest import build_pdf
+
+
+@pytest.fixture(autouse=True)
+def extraction_cache(tmp_path, monkeypatch):
+    """Give each test its own empty extraction cache."""
+    cache = ExtractionCache(directory=str(tmp_path / 'cache'))
+    monkeypatch.setattr(pdf_processor, 'get_extraction_cache', lambda: cache)
+    return cache
+
+
+def test_iter_pages_yields_numbered_pages(pdf_factory):
+    """Test that pages are yielded in order with 1-based page numbers."""
+    path = pdf_factory(["First page", "Second page", "Third page"])
+
+    pages = list(iter_pages(path))
+
+    assert [number for number, _, _ in pages] == [1, 2, 3]
+    assert "First page" in pages[0][1]
+    assert "Third page" in pages[2][1]
+    assert all(error is None for _, _, error in pages)
+
+def test_iter_pages_is_lazy(pdf_factory, monkeypatch):
+    """Test that iter_pages only extracts a page when it is asked for."""
+    original = PyPDF2.PageObject.extract_text
+    extracted = []
+
+    def counting_extract(page, *args, **kwargs):
+        extracted.append(page)
+        return original(page, *args, **kwargs)
+
+    monkeypatch.setattr(PyPDF2.PageObject, 'extract_text', counting_extract)
+    path = pdf_factory(["Only page", "Later page", "Last page"])
+
+    pages = iter_pages(path)
+
+    assert isinstance(pages, types.GeneratorType)
+    assert next(pages)[0] == 1
+    assert len(extracted) == 1
+    pages.close()
+
+def test_extract_text_joins_pages(pdf_factory):
+    """Test that extract_text_from_pdf keeps the page separator format."""
+    path = pdf_factory(["Alpha", "Beta"])
+
+    text = extract_text_from_pdf(path)
+
+    assert text.endswith("\n\n")
+    assert text.index("Alpha") < text.index("Beta")
+
+def test_parallel_extraction_keeps_page_order(pdf_factory, monkeypatch):
+    """Test that sharded extraction reassembles pages in order."""
+    monkeypatch.setattr(pdf_processor, 'PARALLEL_MIN_PAGES', 2)
+    texts = [f"Page number {i}" for i in range(1, 9)]
+    path = pdf_factory(texts)
+
+    result = pdf_processor.extract_pages(path, workers=2)
+
+    assert [number for number, _ in result.pages] == list(range(1, 9))
+    for (_, text), expected in zip(result.pages, texts):
+        assert expected in text
+    assert result.failed_pages == {}
+
+def test_killed_pool_worker_does_not_break_later_extractions(pdf_factory, monkeypatch):
+    """Test that a pool that lost a worker is replaced instead of failing every extraction."""
+    monkeypatch.setattr(pdf_processor, 'PARALLEL_MIN_PAGES', 2)
+    path = pdf_factory([f"Page number {i}" for i in range(1, 9)])
+    assert pdf_processor.extract_pages(path, workers=2, use_cache=False).complete
+
+    broken = pdf_processor._pool
+    os.kill(next(iter(broken._processes)), signal.SIGKILL)
+    result = pdf_processor.extract_pages(path, workers=2, use_cache=False)
+
+    # Shards lost with the worker are reported, never raised
+    assert set(result.failed_pages.values()) <= {pdf_processor.PAGE_WORKER_CRASHED}
+    result = pdf_processor.extract_pages(path, workers=2, use_cache=False)
+    assert result.complete
+    assert pdf_processor._pool is not broken
+
+def test_small_files_fall_back_to_serial(pdf_factory, monkeypatch):
+    """Test that documents below the threshold never touch the pool."""
+    monkeypatch.setattr(pdf_processor, '_get_pool', lambda workers: pytest.fail("pool used"))
+    path = pdf_factory(["One", "Two"])
+
+    result = pdf_processor.extract_pages(path, workers=4)
+
+    assert len(result.pages) == 2
+
+def test_failed_page_does_not_lose_document(pdf_factory, monkeypatch):
+    """Test that a page that fails to extract is reported and skipped."""
+    original = PyPDF2.PageObject.extract_text
+
+    def flaky_extract(page, *args, **kwargs):
+        text = original(page, *args, **kwargs)
+        if "Broken" in text:
+            raise ValueError("corrupt content stream")
+        return text
+
+    monkeypatch.setattr(PyPDF2.PageObject, 'extract_text', flaky_extract)
+    path = pdf_factory(["Good start", "Broken page", "Good end"])
+
+    result = extract_pages(path, workers=1)
+
+    assert list(result.failed_pages) == [2]
+    assert "Good start" in result.text and "Good end" in result.text
+
+def test_repeat_extraction_hits_cache(pdf_factory, extraction_cache, monkeypatch):
+    """Test that a document seen before is served without parsing."""
+    path = pdf_factory(["Cached page one", "Cached page two"])
+    first = extract_pages(path, workers=1)
+    monkeypatch.setattr(pdf_processor, '_extract_page_range',
+                        lambda *args: pytest.fail("document parsed again"))
+
+    second = extract_pages(path, workers=1)
+
+    assert second.pages == first.pages
+    assert extraction_cache.stats()['hits'] == 1
+    assert extraction_cache.stats()['misses'] == 1
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test that the cache stays under its size cap by dropping old entries."""
+    # Entries are compressed, so use text that does not shrink
+    old, recent, new = (random.Random(seed).randbytes(150).hex() for seed in range(3))
+    cache = ExtractionCache(directory=str(tmp_path / 'lru'), max_bytes=600)
+    cache.put('old', [(1, old)])
+    cache.put('recent', [(1, recent)])
+    os.utime(os.path.join(cache.directory, 'old.json'), (0, 0))
+    os.utime(os.path.join(cache.directory, 'recent.json'), (1, 1))
+
+    cache.put('new', [(1, new)])
+
+    assert cache.get('old') is None
+    assert cache.get('recent') == [(1, recent)]
+    assert cache.get('new') == [(1, new)]
+
+@pytest.mark.parametrize("xref_stream", [False, True])
+def test_shared_document_is_parsed_once(pdf_factory, monkeypatch, xref_stream):
+    """Test that counting pages and extracting text reuse one reader, whatever the xref layout."""
+    readers = []
+    original_reader = PyPDF2.PdfReader
+
+    def counting_reader(*args, **kwargs):
+        readers.append(1)
+        return original_reader(*args, **kwargs)
+
+    monkeypatch.setattr(PyPDF2, 'PdfReader', counting_reader)
+    path = pdf_factory(["First", "Second"], xref_stream=xref_stream)
+
+    with pdf_processor.PdfDocument(path) as document:
+        assert document.page_count == 2
+        result = extract_pages(document, workers=1)
+
+    assert len(result.pages) == 2
+    assert len(readers) == 1
+
+def test_probe_page_count_matches_reader(pdf_factory, monkeypatch):
+    """Test that the probe reads /Count without building a reader."""
+    path = pdf_factory([f"Page {i}" for i in range(7)])
+    monkeypatch.setattr(PyPDF2, 'PdfReader', lambda *args: pytest.fail("full parse"))
+
+    assert pdf_processor.probe_page_count(path) == 7
+
+def test_probe_page_count_follows_incremental_updates(tmp_path):
+    """Test that a later revision of the page tree wins over the original."""
+    data = build_pdf(["One", "Two", "Three"])
+    previous_xref = int(data[data.rindex(b"startxref"):].split()[1])
+    update = b"2 0 obj\n<< /Type /Pages /Kids [5 0 R] /Count 1 >>\nendobj\n"
+    xref = (b"xref\n0 1\n0000000000 65535 f \n2 1\n%010d 00000 n \n"
+            b"trailer\n<< /Size 10 /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(data), previous_xref, len(data) + len(update)))
+    path = tmp_path / "updated.pdf"
+    path.write_bytes(data + update + xref)
+
+    assert pdf_processor.probe_page_count(str(path)) == 1
+    assert len(PyPDF2.PdfReader(str(path)).pages) == 1
+
+def test_probe_page_count_falls_back_to_full_parse(pdf_factory, monkeypatch):
+    """Test that files the probe can't follow still get an exact count."""
+    path = pdf_factory(["One", "Two"])
+    monkeypatch.setattr(pdf_processor, '_probe_page_count', lambda data: None)
+
+    assert pdf_processor.probe_page_count(path) == 2
+
+def test_probe_gives_up_without_trailer_root():
+    """Test that the raw probe reports failure rather than guessing."""
+    data = build_pdf(["One", "Two"]).replace(b"/Root", b"/Ruut")
+
+    assert pdf_processor._probe_page_count(data) is None
+
+def test_understated_page_count_is_rejected(tmp_path, extraction_cache):
+    """Test that a root /Count lower than the real page tree can't pass the limit."""
+    path = tmp_path / "understated.pdf"
+    path.write_bytes(build_pdf(["One", "Two", "Three"]).replace(b"/Count 3", b"/Count 1"))
+
+    with pdf_processor.PdfDocument(str(path)) as document:
+        assert document.page_count == 1
+        with pytest.raises(ValueError):
+            extract_pages(document, workers=1)
+
+    # A cached extraction of the same bytes is checked the same way
+    extract_pages(str(path), workers=1)
+    with pdf_processor.PdfDocument(str(path)) as document:
+        assert document.page_count == 1
+        with pytest.raises(ValueError):
+            extract_pages(document, workers=1)
+
+def test_document_shares_one_mapping(pdf_factory, monkeypatch):
+    """Test that probing, hashing and parsing a path all use one mmap."""
+    path = pdf_factory(["Mapped one", "Mapped two"])
+    with open(path, 'rb') as file:
+        expected_hash = hashlib.sha256(file.read()).hexdigest()
+    opened = []
+    original_open = open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return original_open(*args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+    with pdf_processor.PdfDocument(path) as document:
+        assert isinstance(document.buffer(), mmap.mmap)
+        assert document.page_count == 2
+        assert document.sha256 == expected_hash
+        assert "Mapped two" in document.reader.pages[1].extract_text()
+
+    assert opened == [path]
+
+def slow_pages(monkeypatch, marker, seconds):
+    """Make extraction of pages containing `marker` take `seconds`."""
+    original = PyPDF2.PageObject.extract_text
+
+    def slow_extract(page, *args, **kwargs):
+        text = original(page, *args, **kwargs)
+        if marker in text:
+            time.sleep(seconds)
+        return text
+
+    monkeypatch.setattr(PyPDF2.PageObject, 'extract_text', slow_extract)
+
+def test_page_over_budget_is_reported(pdf_factory, monkeypatch):
+    """Test that a page exceeding the page budget is cut off and reported."""
+    slow_pages(monkeypatch, "Stuck", 5)
+    path = pdf_factory(["Fine one", "Stuck page", "Fine three"])
+
+    started = time.time()
+    result = extract_pages(path, workers=1, page_timeout=0.2, document_timeout=10)
+
+    assert time.time() - started < 2
+    assert result.timed_out_pages == [2]
+    assert [number for number, _ in result.pages] == [1, 3]
+    assert not result.complete
+
+def test_document_budget_returns_partial_pages(pdf_factory, monkeypatch, extraction_cache):
+    """Test that running out of document budget keeps the finished pages."""
+    slow_pages(monkeypatch, "Slow", 0.2)
+    path = pdf_factory([f"Slow page {i}" for i in range(1, 11)])
+
+    result = extract_pages(path, workers=1, page_timeout=5, document_timeout=0.5)
+
+    assert 1 <= len(result.pages) < 10
+    assert result.pages[0][0] == 1
+    assert result.skipped_pages[-1] == 10
+    assert len(result.pages) + len(result.timed_out_pages) + len(result.skipped_pages) == 10
+    assert extraction_cache.stats()['entries'] == 0
+
+def build_nested_form_pdf(depth):
+    """Build a one-page PDF whose form XObjects each draw the next one twice."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [4 0 R] /Count 1 >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 3 0 R >> /XObject << /X 6 0 R >> >> /Contents 5 0 R >>",
+    ]
+    content = b"BT /F1 12 Tf 72 720 Td (Before the form) Tj ET /X Do"
+    objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+    for level in range(depth):
+        if level == depth - 1:
+            content = b"BT /F1 12 Tf (Deepest form) Tj ET"
+            resources = b"<< /Font << /F1 3 0 R >> >>"
+        else:
+            content = b"/X Do /X Do"
+            resources = b"<< /XObject << /X %d 0 R >> >>" % (len(objects) + 2)
+        objects.append(b"<< /Type /XObject /Subtype /Form /BBox [0 0 612 792] /Resources %s "
+                       b"/Length %d >>\nstream\n%s\nendstream" % (resources, len(content), content))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+def test_timeout_inside_form_xobject_is_not_swallowed(tmp_path, extraction_cache):
+    """Test that a timeout inside PyPDF2's guarded XObject code still cuts the page off."""
+    # 2**17 form invocations take several seconds; PyPDF2 catches Exception
+    # around each one, so the timeout must get through those handlers
+    path = tmp_path / "nested.pdf"
+    path.write_bytes(build_nested_form_pdf(18))
+
+    started = time.time()
+    result = extract_pages(str(path), workers=1, page_timeout=0.2, document_timeout=30)
+
+    assert time.time() - started < 2
+    assert result.timed_out_pages == [1]
+    assert result.pages == []
+    assert extraction_cache.stats()['entries'] == 0
@@ -0,0 +1,302 @@
+import io
+import os
+import re
+import json
+import time
+import pytest
+from datetime import datetime, timedelta
+import main_routes
+import pdf_routes
+import utils.summarizer as summarizer
+import utils.pdf_processor as pdf_processor
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from conftest import build_pdf
+from extensions import db, login_manager
+from models import User, Summary, Upload
+from models.summary import INTERRUPTED_ERROR
+from utils.document_store import DocumentStore
+from utils.extraction_cache import ExtractionCache
+from utils.llm_backends import LocalBackend
+from utils.jobs import get_job_manager, RUNNING, DONE, FAILED
+
+
+@pytest.fixture(scope="module")
+def web_app(tmp_path_factory):
+    """The real application, with every blueprint registered."""
+    # Background jobs each need their own connection, so use a database file
+    database = tmp_path_factory.mktemp('web') / 'app.sqlite3'
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{database}'
+    # create_app points the shared login manager at its own login page
+    login_view = login_manager.login_view
+    try:
+        yield create_app(testing=True)
+    finally:
+        del os.environ['TEST_DATABASE_URL']
+        login_manager.login_view = login_view
+
+@pytest.fixture
+def db_session(web_app):
+    """
+    The real application's session, replacing the shared test transaction.
+
+    Background jobs commit and roll back on their own threads, which the
+    outer transaction of the conftest session cannot survive.
+    """
+    with web_app.app_context():
+        yield db.session
+        db.session.commit()
+        db.session.remove()
+
+@pytest.fixture
+def free_user(db_session):
+    """Create a free plan user in the real application's database."""
+    user = User(id="free-user-id", email="free@example.com", name="Free User", plan_type="free")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+@pytest.fixture
+def web_client(web_app, free_user):
+    """A client for the real application, logged in as the free user."""
+    client = web_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = free_user.id
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture(autouse=True)
+def local_llm(monkeypatch):
+    """Summarize with the local backend; set error_rate to 1 to make every call fail."""
+    backend = LocalBackend()
+    monkeypatch.setattr(summarizer, 'get_llm_backend', lambda: backend)
+    return backend
+
+@pytest.fixture(autouse=True)
+def extraction_cache(tmp_path, monkeypatch):
+    """Give each test its own empty extraction cache."""
+    cache = ExtractionCache(directory=str(tmp_path / 'extractions'))
+    monkeypatch.setattr(pdf_processor, 'get_extraction_cache', lambda: cache)
+    return cache
+
+@pytest.fixture
+def document_store(tmp_path, monkeypatch):
+    """A document store holding uploads for this test only."""
+    store = DocumentStore(path=str(tmp_path / 'documents.sqlite3'))
+    monkeypatch.setattr(main_routes, 'get_document_store', lambda: store)
+    return store
+
+def pending_document(client, document_store):
+    """Store an upload's text and point the client's session at it."""
+    document_id = document_store.put("Revenue grew in every region this quarter. " * 40, 'report.pdf', 2)
+    with client.session_transaction() as session:
+        session['pdf_document_id'] = document_id
+    return document_id
+
+def poll(client, url, timeout=10):
+    """Poll a status endpoint until it reports done or failed."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(url).get_json()
+        if status['status'] in (DONE, FAILED):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"{url} did not finish")
+
+def read_events(response):
+    """Parse a Server-Sent Events body into (event, data) pairs, skipping comments and settings."""
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+def batch_files(*names):
+    """Form files for a batch upload; names ending in .pdf get a real PDF."""
+    return [(io.BytesIO(build_pdf([f"Quarterly results for {name}."] * 2) if name.endswith('.pdf')
+                        else b"plain text"), name) for name in names]
+
+def test_batch_is_summarized_and_polled(web_client, free_user):
+    """Test that a batch is accepted, processed in the background and reported per file."""
+    response = web_client.post('/pdf/batch', data={'pdf': batch_files('a.pdf', 'notes.txt', 'b.pdf')},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 202
+    batch = poll(web_client, response.get_json()['status_url'])
+    assert batch['counts'] == {DONE: 2, FAILED: 1}
+    assert [item['filename'] for item in batch['items']] == ['a.pdf', 'notes.txt', 'b.pdf']
+    assert batch['items'][0]['summary'] and batch['items'][2]['summary']
+    assert batch['items'][0]['page_count'] == 2
+    assert batch['items'][1]['error'] == "Only PDF files are allowed"
+    assert Upload.query.filter_by(user_id=free_user.id).count() == 2
+    assert web_client.get('/pdf/batch/unknown').status_code == 404
+
+def test_over_quota_batch_is_rejected(web_client, free_user):
+    """Test that a batch larger than the remaining allowance is refused before any work."""
+    names = [f"{index}.pdf" for index in range(free_user.get_monthly_pdf_limit() + 1)]
+
+    response = web_client.post('/pdf/batch', data={'pdf': batch_files(*names)},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 403
+    assert Summary.query.count() == 0
+
+def test_batch_items_fail_when_the_model_fails(web_client, free_user, local_llm):
+    """Test that LLM errors fail each item and give its reserved PDF back."""
+    local_llm.error_rate = 1
+
+    response = web_client.post('/pdf/batch', data={'pdf': batch_files('a.pdf', 'b.pdf')},
+                               content_type='multipart/form-data')
+
+    batch = poll(web_client, response.get_json()['status_url'])
+    assert batch['counts'] == {FAILED: 2}
+    assert batch['items'][0]['error'] == "Error generating summary"
+    assert Upload.query.count() == 0
+    assert free_user.get_remaining_pdfs() == free_user.get_monthly_pdf_limit()
+
+def test_batch_item_is_failed_when_recording_fails(web_client, free_user, monkeypatch, caplog):
+    """Test that an error outside the LLM call fails the item, logs it and releases its quota."""
+    def locked(*args, **kwargs):
+        raise OperationalError("UPDATE monthly_usage", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(pdf_routes, 'record_usage', locked)
+
+    response = web_client.post('/pdf/batch', data={'pdf': batch_files('a.pdf')},
+                               content_type='multipart/form-data')
+
+    batch = poll(web_client, response.get_json()['status_url'])
+    assert batch['items'][0]['status'] == FAILED
+    assert batch['items'][0]['error'] == "Error generating summary"
+    # The job manager logs the error once the stage has failed the item
+    job = get_job_manager().get(Summary.query.one().id)
+    for _ in range(100):
+        if job.finished:
+            break
+        time.sleep(0.05)
+    assert job.status == FAILED
+    assert "database is locked" in caplog.text
+    assert free_user.get_remaining_pdfs() == free_user.get_monthly_pdf_limit()
+
+def test_streamed_summary_is_relayed_and_saved(web_client, document_store):
+    """Test that the stream relays the summary job's output and the job saves it."""
+    document_id = pending_document(web_client, document_store)
+
+    page = web_client.get('/preview_to_summary')
+    assert page.status_code == 200
+    stream_url = re.search(r'data-stream-url="([^"]+)"', page.get_data(as_text=True)).group(1)
+    events = read_events(web_client.get(stream_url))
+
+    assert [event for event, _ in events[:-1]] == ['chunk'] * (len(events) - 1)
+    assert events[-1][0] == 'done'
+    summary = db.session.get(Summary, events[-1][1]['summary_id'])
+    assert summary.status == DONE
+    assert "".join(data['text'] for _, data in events[:-1]) == summary.text
+    assert Upload.query.count() == 1
+    assert document_store.get(document_id) is None
+
+def test_failed_stream_keeps_the_document(web_client, document_store, local_llm):
+    """Test that a failed summary is reported on the stream and the upload is kept for a retry."""
+    local_llm.error_rate = 1
+    document_id = pending_document(web_client, document_store)
+
+    page = web_client.get('/preview_to_summary')
+    stream_url = re.search(r'data-stream-url="([^"]+)"', page.get_data(as_text=True)).group(1)
+    events = read_events(web_client.get(stream_url))
+
+    assert events[-1][0] == 'failed'
+    assert Summary.query.one().status == FAILED
+    assert Upload.query.count() == 0
+    assert document_store.get(document_id) is not None
+
+def test_stream_of_a_job_in_another_worker_sends_the_saved_summary(web_client, free_user, db_session):
+    """Test that a summary without a local job is streamed from its row in one piece."""
+    db_session.add(Summary(id="other-worker", user_id=free_user.id, filename="report.pdf",
+                           text="Saved summary", status=DONE))
+    db_session.commit()
+
+    events = read_events(web_client.get('/summary/other-worker/stream'))
+
+    assert events == [('summary', {'text': "Saved summary"}),
+                      ('done', {'summary_id': "other-worker", 'url': "/summary/other-worker"})]
+
+def test_reconnected_stream_resumes_after_the_last_chunk(web_client, document_store):
+    """Test that a stream opened with Last-Event-ID sends only the chunks after it."""
+    pending_document(web_client, document_store)
+    page = web_client.get('/preview_to_summary')
+    stream_url = re.search(r'data-stream-url="([^"]+)"', page.get_data(as_text=True)).group(1)
+    events = read_events(web_client.get(stream_url))
+
+    resumed = read_events(web_client.get(stream_url, headers={'Last-Event-ID': '2'}))
+
+    assert len(events) > 3
+    assert resumed == events[2:]
+
+def test_stream_ends_early_for_the_browser_to_reconnect(web_client, free_user, db_session, monkeypatch):
+    """Test that a stream stops at its maximum duration without a final event."""
+    monkeypatch.setattr(main_routes, 'SSE_MAX_DURATION', 0.2)
+    db_session.add(Summary(id="still-running", user_id=free_user.id, filename="report.pdf", text='',
+                           status=RUNNING))
+    db_session.commit()
+    started = time.time()
+
+    response = web_client.get('/summary/still-running/stream')
+
+    assert read_events(response) == []
+    assert 'retry: ' in response.get_data(as_text=True)
+    assert time.time() - started < 5
+
+def test_stream_of_a_lost_job_reports_it_failed(web_client, free_user, db_session):
+    """Test that a summary whose job stopped sending heartbeats ends its stream as failed."""
+    db_session.add(Summary(id="orphaned", user_id=free_user.id, filename="report.pdf", text='',
+                           status=RUNNING, heartbeat_at=datetime.utcnow() - timedelta(hours=1)))
+    db_session.commit()
+
+    events = read_events(web_client.get('/summary/orphaned/stream'))
+
+    assert events == [('failed', {'message': INTERRUPTED_ERROR})]
+
+def test_background_summary_status_is_polled(web_client, document_store):
+    """Test that a background summary reports its progress from the Summary table."""
+    pending_document(web_client, document_store)
+
+    response = web_client.get('/preview_to_summary?background=1')
+    assert response.status_code == 302
+    summary_id = response.location.rsplit('/', 1)[1]
+    status = poll(web_client, f'/summary/{summary_id}/status')
+
+    assert status == {'id': summary_id, 'label': 'report.pdf', 'status': DONE, 'error': None}
+    assert web_client.get(f'/summary/{summary_id}').status_code == 200
+    assert web_client.get('/summary/unknown/status').status_code == 404
+
+def test_failed_background_summary_reports_its_error(web_client, document_store, local_llm):
+    """Test that an LLM failure is reported by the status endpoint and nothing is counted."""
+    local_llm.error_rate = 1
+    pending_document(web_client, document_store)
+
+    response = web_client.get('/preview_to_summary?background=1')
+    status = poll(web_client, response.location + '/status')
+
+    assert status['status'] == FAILED
+    assert status['error'] == 'Error generating summary. Please try again.'
+    assert Upload.query.count() == 0
+
+def test_summary_lost_with_its_worker_is_reported_failed(web_client, free_user, db_session):
+    """Test that a summary whose job stopped sending heartbeats is failed when its status is read."""
+    db_session.add(Summary(id="orphaned", user_id=free_user.id, filename="report.pdf", text='',
+                           status=RUNNING, heartbeat_at=datetime.utcnow() - timedelta(hours=1)))
+    db_session.commit()
+
+    status = web_client.get('/summary/orphaned/status').get_json()
+
+    assert status['status'] == FAILED
+    assert status['error'] == INTERRUPTED_ERROR
+
+def test_summary_status_is_private(web_client, db_session):
+    """Test that another user's summary is reported as not found."""
+    db_session.add(User(id="other-user-id", email="other@example.com", name="Other User"))
+    db_session.add(Summary(id="someone-elses", user_id="other-user-id", filename="private.pdf",
+                           text='', status=DONE))
+    db_session.commit()
+
+    assert web_client.get('/summary/someone-elses/status').status_code == 404
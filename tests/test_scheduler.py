@@ -0,0 +1,95 @@
+import pytest
+import time
+import threading
+from utils.scheduler import PriorityScheduler, parse_plan_values
+
+
+@pytest.fixture
+def single_slot():
+    """A one-slot scheduler whose slot is held until the test releases it."""
+    scheduler = PriorityScheduler(1)
+    release = threading.Event()
+    scheduler.submit(release.wait, 5, plan='free')
+    yield scheduler, release
+    release.set()
+    scheduler.shutdown()
+
+def test_pro_work_starts_first(single_slot):
+    """Test that queued pro work overtakes free work queued before it."""
+    scheduler, release = single_slot
+    order = []
+    futures = [scheduler.submit(order.append, f"free-{i}", plan='free') for i in range(3)]
+    futures += [scheduler.submit(order.append, f"pro-{i}", plan='pro') for i in range(3)]
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    assert order == ["pro-0", "pro-1", "pro-2", "free-0", "free-1", "free-2"]
+
+def test_free_work_is_not_starved(single_slot):
+    """Test that free work gets its weighted share while pro work is queued."""
+    scheduler, release = single_slot
+    order = []
+    futures = [scheduler.submit(order.append, "pro", plan='pro') for _ in range(16)]
+    futures += [scheduler.submit(order.append, "free", plan='free') for _ in range(4)]
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    # One free task per four pro tasks while both are queued
+    assert order.index("free") == 5
+    assert order[:15].count("free") == 2
+
+def test_plan_share_caps_concurrency():
+    """Test that a plan never holds more than its share of the slots."""
+    scheduler = PriorityScheduler(4, shares={'free': 0.5})
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def task():
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+
+    for future in [scheduler.submit(task, plan='free') for _ in range(8)]:
+        future.result(timeout=5)
+    scheduler.shutdown()
+
+    assert state["peak"] == 2
+
+def test_slot_runs_on_calling_thread_and_records_wait():
+    """Test that slot() admits the caller and queue waits are reported per plan."""
+    scheduler = PriorityScheduler(1)
+
+    with scheduler.slot('starter'):
+        assert scheduler.stats()["plans"]["starter"]["running"] == 1
+        waiter = threading.Thread(target=lambda: scheduler.slot('pro').__enter__())
+        waiter.start()
+        time.sleep(0.05)
+        assert scheduler.stats()["plans"]["pro"]["queued"] == 1
+    waiter.join(timeout=5)
+
+    stats = scheduler.stats()["plans"]
+    assert stats["pro"]["running"] == 1
+    assert stats["pro"]["max_wait_seconds"] >= 0.05
+    assert stats["starter"]["started"] == 1
+    scheduler.shutdown()
+
+def test_unknown_plan_is_scheduled_as_free():
+    """Test that missing or unknown plans fall back to the free tier."""
+    scheduler = PriorityScheduler(1)
+
+    assert scheduler.submit(lambda: "done", plan=None).result(timeout=5) == "done"
+    assert scheduler.stats()["plans"]["free"]["started"] == 1
+    scheduler.shutdown()
+
+def test_parse_plan_values():
+    """Test parsing of per-plan settings from the environment."""
+    assert parse_plan_values("pro:8, free:0.5", {'pro': 4, 'starter': 2, 'free': 1}) == \
+        {'pro': 8.0, 'starter': 2, 'free': 0.5}
+    assert parse_plan_values(None, {'pro': 4}) == {'pro': 4}
@@ -0,0 +1,74 @@
+import random
+import pytest
+import utils.storage_codec as storage_codec
+from utils.storage_codec import create_codec, compress_text, decompress_text, train_dictionary
+
+
+def summaries(count, seed=0):
+    """Summary-like texts built from a shared vocabulary."""
+    rng = random.Random(seed)
+    phrases = ["The key findings of the report", "revenue grew in the quarter",
+               "customers in the enterprise segment", "the main risks identified include",
+               "In conclusion, the document recommends", "operating costs were reduced"]
+    return [". ".join(rng.choice(phrases) for _ in range(12)) + "." for _ in range(count)]
+
+@pytest.mark.parametrize("name", ["zlib", "lzma", "none"])
+def test_every_codec_round_trips(name):
+    """Test that each codec decodes its own output without being told which it was."""
+    text = summaries(1)[0] + " Ünïcode ✓"
+
+    blob = compress_text(text, create_codec(name))
+
+    assert decompress_text(blob) == text
+
+def test_trained_dictionary_compresses_short_texts_better():
+    """Test that a dictionary trained on the corpus beats plain zlib on new samples."""
+    dictionary = train_dictionary(summaries(200))
+    plain, primed = create_codec('zlib'), create_codec('zlib', dictionary=dictionary)
+    samples = summaries(20, seed=1)
+
+    plain_size = sum(len(compress_text(text, plain)) for text in samples)
+    primed_size = sum(len(compress_text(text, primed)) for text in samples)
+
+    assert primed_size < plain_size
+    assert all(decompress_text(compress_text(text, primed)) == text for text in samples)
+
+def test_uncompressed_legacy_values_are_returned_as_text():
+    """Test that rows written before compression are still readable."""
+    assert decompress_text("plain summary") == "plain summary"
+    assert decompress_text(b'{"pages": [[1, "text"]]}') == '{"pages": [[1, "text"]]}'
+    assert decompress_text(None) is None
+
+@pytest.mark.parametrize("text", ["80% of revenue grew", "(S) Section", "x is a variable",
+                                  "x\x9c is not a zlib stream"])
+def test_legacy_text_that_looks_compressed_is_returned_as_text(text):
+    """Test that plain text starting like a zlib header is not mistaken for a compressed blob."""
+    assert decompress_text(text.encode('utf-8')) == text
+
+def test_undecodable_blob_still_fails(monkeypatch):
+    """Test that a compressed blob whose dictionary is gone is reported, not returned as text."""
+    blob = compress_text("Quarterly summary", create_codec('zlib', dictionary=b"quarterly revenue summary"))
+    monkeypatch.setattr(storage_codec, '_dictionaries', {})
+
+    with pytest.raises(ValueError):
+        decompress_text(blob)
+
+def test_unknown_codec_is_rejected():
+    """Test that a misconfigured codec name fails loudly."""
+    with pytest.raises(ValueError):
+        create_codec('brotli')
+
+def test_retired_dictionaries_still_decode(tmp_path, monkeypatch):
+    """Test that rows compressed with an older dictionary stay readable after rotation."""
+    old, new = tmp_path / "old.dict", tmp_path / "new.dict"
+    old.write_bytes(train_dictionary(summaries(100, seed=2)))
+    new.write_bytes(train_dictionary(summaries(100, seed=3)))
+    text = summaries(1, seed=4)[0]
+    blob = compress_text(text, create_codec('zlib', dictionary=old.read_bytes()))
+
+    monkeypatch.setattr(storage_codec, '_dictionaries', {})
+    monkeypatch.setattr(storage_codec, '_default_codec', None)
+    monkeypatch.setenv('STORAGE_CODEC_DICTIONARY', f"{new},{old}")
+
+    assert storage_codec.get_storage_codec().dictionary == new.read_bytes()
+    assert decompress_text(blob) == text
@@ -0,0 +1,81 @@
+import pytest
+import time
+import threading
+import utils.summarizer as summarizer
+from utils.summarizer import chunk_text, generate_summary
+from utils.token_counter import count_tokens
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replace the model call with one that records prompts and concurrency."""
+    calls = []
+    state = {"in_flight": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_complete(prompt, max_tokens, usage=None):
+        with lock:
+            calls.append(prompt)
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        time.sleep(0.01)
+        with lock:
+            state["in_flight"] -= 1
+        return f"summary {len(calls)}"
+
+    monkeypatch.setattr(summarizer, '_complete', fake_complete)
+    return calls, state
+
+def test_chunk_text_respects_paragraphs_and_budget():
+    """Test that chunks stay under budget and never split a paragraph."""
+    paragraphs = [f"Paragraph {i} " + "word " * 40 for i in range(30)]
+    text = "\n\n".join(paragraphs)
+
+    chunks = chunk_text(text, max_tokens=200)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+    assert "\n\n".join(chunks) == "\n\n".join(p.strip() for p in paragraphs)
+
+def test_chunk_text_splits_oversized_paragraph():
+    """Test that a single huge paragraph is split to fit the budget."""
+    chunks = chunk_text("A sentence here. " * 500, max_tokens=100)
+
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+
+def test_short_document_uses_single_call(fake_llm):
+    """Test that short text is summarized in one prompt."""
+    calls, _ = fake_llm
+
+    assert generate_summary("A short document.") == "summary 1"
+    assert len(calls) == 1
+
+def test_long_document_is_map_reduced(fake_llm, monkeypatch):
+    """Test that long text is chunked, summarized concurrently and reduced."""
+    calls, state = fake_llm
+    monkeypatch.setattr(summarizer, 'SINGLE_PASS_TOKENS', 500)
+    text = "\n\n".join(f"Section {i}. " + "content " * 150 for i in range(40))
+
+    summary = summarizer.generate_summary(text, max_concurrency=3)
+
+    section_calls = [c for c in calls if c.startswith(summarizer.SECTION_PROMPT[:30])]
+    assert len(section_calls) == len(chunk_text(text))
+    assert calls[-1].startswith(summarizer.COMBINE_PROMPT[:30])
+    assert summary == f"summary {len(calls)}"
+    assert 1 < state["peak"] <= 3
+
+def test_reduce_terminates_when_summaries_exceed_budget(monkeypatch):
+    """Test that the reduce tree converges even if summaries can't be batched."""
+    calls = []
+
+    def verbose_complete(prompt, max_tokens, usage=None):
+        calls.append(prompt)
+        return "long partial summary " * 20
+
+    monkeypatch.setattr(summarizer, '_complete', verbose_complete)
+    text = "\n\n".join("word " * 40 for _ in range(9))
+
+    summarizer.summarize_map_reduce(text, chunk_tokens=60, max_concurrency=2)
+
+    # 9 map calls, pairwise levels of 5, 3 and 2, then the final call
+    assert len(calls) == 9 + 5 + 3 + 2 + 1
@@ -0,0 +1,77 @@
+import pytest
+import time
+import utils.summarizer as summarizer
+from utils.summary_cache import SummaryCache, summary_cache_key
+
+
+@pytest.fixture
+def counted_llm(monkeypatch):
+    """Replace the model call with one that counts invocations."""
+    calls = []
+
+    def fake_complete(prompt, max_tokens, usage=None):
+        calls.append(prompt)
+        if usage is not None:
+            usage.add(50, 10)
+        return f"summary {len(calls)}"
+
+    monkeypatch.setattr(summarizer, '_complete', fake_complete)
+    return calls
+
+def test_repeat_request_skips_llm(counted_llm, summary_cache):
+    """Test that summarizing the same text twice makes one LLM call."""
+    first = summarizer.generate_summary("Quarterly results were strong.")
+    second = summarizer.generate_summary("Quarterly  results were\nstrong.")
+
+    assert first == second == "summary 1"
+    assert len(counted_llm) == 1
+    assert summary_cache.stats()["hits"] == 1
+
+def test_options_are_part_of_the_key(counted_llm):
+    """Test that different options or lengths produce separate summaries."""
+    summarizer.generate_summary("Same text.", document_type="legal")
+    summarizer.generate_summary("Same text.", document_type="business")
+    summarizer.generate_summary("Same text.", document_type="legal", max_tokens=200)
+
+    assert len(counted_llm) == 3
+
+def test_errors_are_not_cached(monkeypatch, summary_cache):
+    """Test that a failed call is retried rather than served from the cache."""
+    def failing_complete(prompt, max_tokens, usage=None):
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(summarizer, '_complete', failing_complete)
+    summarizer.generate_summary("Flaky text.")
+
+    assert summary_cache.stats()["entries"] == 0
+
+def test_entries_survive_a_new_cache_instance(tmp_path):
+    """Test that the SQLite backend keeps summaries across restarts."""
+    path = str(tmp_path / "cache.sqlite3")
+    key = summary_cache_key("text", "gpt-3.5-turbo", max_tokens=500)
+    SummaryCache(path=path).put(key, "stored summary")
+
+    assert SummaryCache(path=path).get(key) == "stored summary"
+
+def test_expired_entries_miss(tmp_path):
+    """Test that entries older than the TTL are not returned."""
+    cache = SummaryCache(path=str(tmp_path / "cache.sqlite3"), ttl=0.05)
+    cache.put("key", "old summary")
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    """Test that the store is trimmed to max_entries, keeping recent reads."""
+    cache = SummaryCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2, memory_entries=0)
+    cache.put("a", "summary a")
+    time.sleep(0.01)
+    cache.put("b", "summary b")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "summary c")
+
+    assert cache.get("a") == "summary a"
+    assert cache.get("b") is None
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from sqlalchemy import inspect
+from models import Summary
+from models.summary import INTERRUPTED_ERROR
+from extensions import db
+from utils.jobs import QUEUED, RUNNING, DONE, FAILED
+
+
+def test_summary_body_is_compressed_and_deferred(app, free_user, db_session):
+    """Test that a stored summary round-trips and its body loads only when read."""
+    with app.app_context():
+        text = "Revenue grew in every region this quarter. " * 200
+        db_session.add(Summary(id="summary-1", user_id=free_user.id, filename="report.pdf",
+                               page_count=3, text=text))
+        db_session.commit()
+        db_session.expunge_all()
+
+        loaded = db_session.get(Summary, "summary-1")
+        assert 'text' in inspect(loaded).unloaded
+        assert loaded.filename == "report.pdf"
+        assert loaded.text == text
+
+        stored = db_session.execute(db.text("SELECT body FROM summary WHERE id = 'summary-1'")).scalar()
+        assert len(stored) * 4 < len(text)
+
+def test_summaries_are_indexed_by_user_and_date(app):
+    """Test that listing a user's recent summaries is backed by an index."""
+    with app.app_context():
+        indexes = inspect(db.engine).get_indexes('summary')
+
+        assert any(index['column_names'] == ['user_id', 'created_at'] for index in indexes)
+
+def test_summaries_without_heartbeats_are_failed(app, free_user, db_session):
+    """Test that only unfinished summaries whose heartbeat stopped are failed, releasing batch PDFs."""
+    with app.app_context():
+        long_ago = datetime.utcnow() - timedelta(hours=1)
+        usage = free_user.get_current_monthly_usage()
+        usage.pdf_count = 1
+        db_session.add_all([
+            Summary(id="lost", user_id=free_user.id, filename="a.pdf", text='', status=QUEUED,
+                    heartbeat_at=long_ago),
+            Summary(id="lost-item", user_id=free_user.id, filename="b.pdf", text='', status=RUNNING,
+                    heartbeat_at=long_ago, batch_id="batch-1", batch_index=0),
+            Summary(id="alive", user_id=free_user.id, filename="c.pdf", text='', status=RUNNING),
+            Summary(id="finished", user_id=free_user.id, filename="d.pdf", text='done', status=DONE,
+                    heartbeat_at=long_ago),
+        ])
+        db_session.commit()
+
+        assert Summary.fail_stale(max_age=60) == 2
+
+        statuses = {summary.id: summary.status for summary in Summary.query}
+        assert statuses == {"lost": FAILED, "lost-item": FAILED, "alive": RUNNING, "finished": DONE}
+        assert db_session.get(Summary, "lost").error == INTERRUPTED_ERROR
+        assert free_user.get_current_monthly_usage().pdf_count == 0
+        assert Summary.fail_stale(max_age=60) == 0
+
+def test_heartbeat_keeps_summaries_alive(app, free_user, db_session):
+    """Test that a heartbeat refreshes unfinished summaries so they are not failed."""
+    with app.app_context():
+        long_ago = datetime.utcnow() - timedelta(hours=1)
+        db_session.add(Summary(id="running", user_id=free_user.id, filename="a.pdf", text='',
+                               status=RUNNING, heartbeat_at=long_ago))
+        db_session.commit()
+
+        Summary.beat(["running"])
+
+        assert Summary.fail_stale(max_age=60) == 0
+        assert db_session.get(Summary, "running").status == RUNNING
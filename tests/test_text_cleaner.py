@@ -0,0 +1,83 @@
+import pytest
+from utils.text_cleaner import normalize_pages
+
+
+def make_pages(bodies, header="ACME Corp - Confidential", footer="Page {n} of {total}"):
+    """Build extracted pages that share a running header and footer."""
+    total = len(bodies)
+    return [(n, f"{header}\n{body}\n{footer.format(n=n, total=total)}")
+            for n, body in enumerate(bodies, start=1)]
+
+def make_body(first_line, length=8):
+    """Build a page body long enough to have header and footer zones."""
+    return "\n".join([first_line] + [f"{first_line} detail {i}." for i in range(1, length)])
+
+def test_repeated_header_and_footer_are_removed():
+    """Test that lines repeated on every page are stripped."""
+    bodies = [make_body(line) for line in ["Revenue grew in Q1.", "Costs fell in Q2.", "Outlook is stable."]]
+    pages = make_pages(bodies)
+
+    cleaned, report = normalize_pages(pages)
+
+    assert [text for _, text in cleaned] == bodies
+    assert report.removed_lines == 6
+    assert report.tokens_saved > 0
+
+def test_pages_can_be_streamed_in():
+    """Test that a generator of pages is normalized like the same pages in a list."""
+    pages = make_pages([make_body(line) for line in ["Revenue grew in Q1.", "Costs fell in Q2.", "Outlook is stable."]])
+
+    streamed, streamed_report = normalize_pages(page for page in pages)
+    listed, listed_report = normalize_pages(pages)
+
+    assert streamed == listed
+    assert streamed_report.removed_lines == listed_report.removed_lines
+    assert streamed_report.tokens_saved == listed_report.tokens_saved
+
+def test_numbers_in_content_are_not_masked():
+    """Test that lines differing only in figures are not taken for running headers."""
+    bodies = [make_body(f"Revenue {n}0M") for n in range(1, 5)]
+
+    cleaned, report = normalize_pages(make_pages(bodies))
+
+    assert [text for _, text in cleaned] == bodies
+    assert report.removed_lines == 8
+
+def test_short_slide_pages_are_kept():
+    """Test that slide-like pages repeating their layout lose no content."""
+    pages = [(n, f"Q{n} results\nRevenue 10M\nChurn 3%") for n in range(1, 5)]
+
+    cleaned, report = normalize_pages(pages)
+
+    assert [text for _, text in cleaned] == [text for _, text in pages]
+    assert report.removed_lines == 0
+
+def test_page_is_never_emptied():
+    """Test that a page made only of a page number keeps its text."""
+    cleaned, report = normalize_pages([(1, "12")])
+
+    assert cleaned[0][1] == "12"
+    assert report.removed_lines == 0
+
+def test_repeated_body_lines_are_kept():
+    """Test that text repeated in the middle of pages is never removed."""
+    body = "Opening line\nSecond\nThird\nFourth\n{}\nThe parties agree.\nSixth\nSeventh\nEighth\nNinth"
+    pages = [(n, body.format(f"Unique sentence {n}.")) for n in range(1, 4)]
+
+    cleaned, _ = normalize_pages(pages)
+
+    assert all("The parties agree." in text for _, text in cleaned)
+    assert all("Opening line" not in text for _, text in cleaned)
+
+def test_page_numbers_removed_on_single_page():
+    """Test that a bare page number at the page edge is dropped."""
+    cleaned, report = normalize_pages([(1, "Summary of findings\nAll good.\n1")])
+
+    assert cleaned[0][1] == "Summary of findings\nAll good."
+    assert report.removed_lines == 1
+
+def test_hyphenation_and_whitespace_are_fixed():
+    """Test that hyphenated breaks are rejoined and spaces collapsed."""
+    cleaned, _ = normalize_pages([(1, "An impor-\ntant   result\t here.\n\n\n\nNext")])
+
+    assert cleaned[0][1] == "An important result here.\n\nNext"
@@ -0,0 +1,98 @@
+import pytest
+from flask import g
+import utils.token_counter as token_counter
+import utils.summarizer as summarizer
+from utils.token_counter import count_tokens, count_chat_tokens, fits_context, estimate_cost, TokenUsage
+import decorators
+from decorators import get_request_token_count
+from utils.pdf_processor import PdfDocument, extract_pages
+
+
+@pytest.fixture
+def offline_counter(monkeypatch):
+    """Force the local approximation and start with an empty count cache."""
+    monkeypatch.setattr(token_counter, 'tiktoken', None)
+    monkeypatch.setattr(token_counter, '_encodings', {})
+    monkeypatch.setattr(token_counter, '_counts', token_counter.OrderedDict())
+
+def test_offline_count_tracks_bpe_splits(offline_counter):
+    """Test that the approximation counts words, punctuation and digit groups."""
+    # cl100k: Hello , world ! This is a test .
+    assert count_tokens("Hello, world! This is a test.") == 9
+    # Digits are grouped in threes: 123 456 7
+    assert count_tokens("1234567") == 3
+    assert count_tokens("") == 0
+
+def test_offline_count_is_far_closer_than_page_estimate(offline_counter):
+    """Test that a short page is not billed like a full one."""
+    page = "The quarterly report shows revenue growth across all regions."
+
+    assert 8 <= count_tokens(page) <= 14
+    assert count_tokens(page) < 500 / 10
+
+def test_counts_are_cached_by_text_hash(offline_counter, monkeypatch):
+    """Test that the same text is only tokenized once."""
+    calls = []
+    approximate = token_counter._approximate_count
+    monkeypatch.setattr(token_counter, '_approximate_count',
+                        lambda text: calls.append(text) or approximate(text))
+
+    first = count_tokens("Repeated document text. " * 100)
+    second = count_tokens("Repeated document text. " * 100)
+
+    assert first == second
+    assert len(calls) == 1
+
+def test_prediction_helpers():
+    """Test chat framing, context fit and cost predictions."""
+    messages = [{"role": "user", "content": "Hello, world!"}]
+
+    assert count_chat_tokens(messages) == count_tokens("Hello, world!") + 6
+    assert fits_context(15000, 1000, "gpt-3.5-turbo")
+    assert not fits_context(8000, 500, "gpt-4")
+    assert estimate_cost(1000, 1000, "gpt-3.5-turbo") == pytest.approx(0.002)
+
+def test_map_reduce_records_actual_usage(monkeypatch):
+    """Test that usage from every LLM call is summed into one tally."""
+    def billed_complete(prompt, max_tokens, usage=None):
+        usage.add(100, 20)
+        return "partial summary"
+
+    monkeypatch.setattr(summarizer, '_complete', billed_complete)
+    monkeypatch.setattr(summarizer, 'SINGLE_PASS_TOKENS', 50)
+    text = "\n\n".join("word " * 40 for _ in range(6))
+    usage = TokenUsage()
+
+    summarizer.generate_summary(text, usage=usage)
+
+    assert usage.calls > 1
+    assert usage.prompt_tokens == 100 * usage.calls
+    assert usage.total_tokens == 120 * usage.calls
+
+def test_tracked_tokens_prefer_actual_usage(app):
+    """Test that usage tracking uses the LLM's reported usage when present."""
+    with app.test_request_context():
+        assert get_request_token_count(None) == 0
+
+        g.token_usage = TokenUsage()
+        g.token_usage.add(812, 143)
+
+        assert get_request_token_count(None) == 955
+
+def test_cache_hits_record_the_document_tokens():
+    """Test that a summary served without LLM calls still records the text's tokens."""
+    text = "A cached summary still costs the plan its document tokens."
+    usage = TokenUsage()
+
+    assert usage.recorded_tokens(text) == count_tokens(text)
+
+    usage.add(812, 143)
+    assert usage.recorded_tokens(text) == 955
+
+def test_tracked_tokens_count_the_text_already_extracted(app, pdf_factory, monkeypatch):
+    """Test that usage tracking counts the request's extraction instead of extracting again."""
+    with app.test_request_context(), PdfDocument(pdf_factory(["Alpha", "Beta"])) as document:
+        extraction = extract_pages(document, workers=1, use_cache=False)
+        monkeypatch.setattr(decorators, 'extract_pages', lambda *args: pytest.fail("extracted again"))
+
+        assert get_request_token_count(document) == count_tokens(extraction.text)
@@ -0,0 +1,188 @@
+import pytest
+import io
+import os
+import hashlib
+from concurrent.futures import Future
+from flask import Flask, request, jsonify
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from extensions import login_manager
+from decorators import limit_upload_size, ingest_request_upload, close_request_document
+import utils.pdf_processor as pdf_processor
+from utils.uploads import ingest_upload, SpoolingRequest
+from utils.pdf_processor import PdfDocument, extract_pages
+from utils.extraction_cache import ExtractionCache
+from conftest import build_pdf
+
+
+def make_file_storage(data, filename="report.pdf"):
+    """Wrap raw bytes in a Werkzeug FileStorage like a form upload."""
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+def test_small_upload_stays_in_memory():
+    """Test that small uploads are hashed and kept in memory."""
+    data = build_pdf(["In memory"])
+
+    upload = ingest_upload(make_file_storage(data), spool_max_memory=1024 * 1024)
+
+    assert upload.in_memory
+    assert upload.size == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.is_pdf
+    assert bytes(upload.buffer()) == data
+
+def test_large_upload_spools_to_named_file():
+    """Test that uploads over the threshold are spooled and memory-mapped."""
+    data = build_pdf(["Spooled"]) + b"%" * 4096
+
+    upload = ingest_upload(make_file_storage(data), spool_max_memory=512, chunk_size=256)
+
+    assert not upload.in_memory
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.buffer()[:] == data
+    with pytest.raises(TypeError):
+        upload.buffer()[0] = 0
+    path = upload.path
+    assert os.path.isfile(path)
+    upload.close()
+    assert not os.path.exists(path)
+
+def test_spooled_request_file_is_adopted_not_copied(monkeypatch):
+    """Test that a part Werkzeug wrote to disk becomes the upload's own file."""
+    monkeypatch.setattr('utils.uploads.SPOOL_MAX_MEMORY', 1024)
+    spooling_app = Flask(__name__)
+    spooling_app.request_class = SpoolingRequest
+    data = build_pdf(["Adopted"]) + b"%" * 4096
+    seen = {}
+
+    @spooling_app.route('/upload', methods=['POST'])
+    def upload_route():
+        file_storage = request.files['pdf']
+        spooled_name = file_storage.stream.name
+        seen['upload'] = ingest_upload(file_storage, spool_max_memory=1024)
+        seen['spooled_name'] = spooled_name
+        return jsonify({})
+
+    response = spooling_app.test_client().post(
+        '/upload', data={'pdf': (io.BytesIO(data), 'big.pdf')}, content_type='multipart/form-data')
+
+    upload = seen['upload']
+    assert response.status_code == 200
+    # Closing the request did not delete the file the upload now owns
+    assert upload.path == seen['spooled_name']
+    assert os.path.isfile(upload.path)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.is_pdf and bytes(upload.buffer()) == data
+    upload.close()
+    assert not os.path.exists(seen['spooled_name'])
+
+def test_parallel_extraction_sends_spooled_path(tmp_path, monkeypatch):
+    """Test that pool workers get a spooled upload's path, not its bytes."""
+    monkeypatch.setattr(pdf_processor, 'PARALLEL_MIN_PAGES', 2)
+    monkeypatch.setattr(pdf_processor, 'get_extraction_cache',
+                        lambda: ExtractionCache(directory=str(tmp_path / 'cache')))
+    payloads = []
+    original = pdf_processor._extract_page_range
+
+    class InlinePool:
+        """Runs shards on the calling thread and records what was sent."""
+
+        def submit(self, func, source, *args):
+            payloads.append(source)
+            future = Future()
+            future.set_result(original(source, *args))
+            return future
+
+    monkeypatch.setattr(pdf_processor, '_get_pool', lambda workers: InlinePool())
+    texts = [f"Spooled page {i}" for i in range(1, 9)]
+    upload = ingest_upload(make_file_storage(build_pdf(texts)), spool_max_memory=0)
+
+    with PdfDocument(upload) as document:
+        result = extract_pages(document, workers=2)
+
+    assert payloads and set(payloads) == {upload.path}
+    assert [number for number, _ in result.pages] == list(range(1, 9))
+    upload.close()
+
+def test_same_filename_uploads_do_not_collide():
+    """Test that two uploads named report.pdf keep their own contents."""
+    first = ingest_upload(make_file_storage(build_pdf(["First"])), spool_max_memory=0)
+    second = ingest_upload(make_file_storage(build_pdf(["Second"])), spool_max_memory=0)
+
+    assert first.filename == second.filename == "report.pdf"
+    assert first.sha256 != second.sha256
+    assert bytes(first.buffer()) != bytes(second.buffer())
+
+def test_header_sniffing_rejects_non_pdf():
+    """Test that a renamed non-PDF file is detected from its bytes."""
+    upload = ingest_upload(make_file_storage(b"PK\x03\x04 not a pdf", "fake.pdf"))
+
+    assert not upload.is_pdf
+
+def test_document_reads_from_upload_buffer(tmp_path, monkeypatch):
+    """Test that probing and extraction work from the upload without a path."""
+    cache = ExtractionCache(directory=str(tmp_path / 'cache'))
+    monkeypatch.setattr(pdf_processor, 'get_extraction_cache', lambda: cache)
+    upload = ingest_upload(make_file_storage(build_pdf(["Alpha", "Beta", "Gamma"])))
+
+    with PdfDocument(upload) as document:
+        assert document.page_count == 3
+        result = extract_pages(document, workers=1)
+
+    assert "Gamma" in result.text
+    assert cache.get(upload.sha256) == result.pages
+
+def test_ingest_stops_one_byte_past_limit():
+    """Test that ingestion aborts as soon as the file passes max_size."""
+    stream = io.BytesIO(b"%PDF-" + b"x" * 10000)
+    file_storage = FileStorage(stream=stream, filename="big.pdf")
+
+    with pytest.raises(RequestEntityTooLarge):
+        ingest_upload(file_storage, max_size=1000, chunk_size=256)
+
+    assert stream.tell() == 1001
+
+@pytest.fixture
+def size_limited_app():
+    """A minimal app with one upload route guarded by limit_upload_size."""
+    limited_app = Flask(__name__)
+    limited_app.config['SECRET_KEY'] = 'test_key'
+    limited_app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+    limited_app.config['FREE_TIER_MAX_SIZE'] = 64 * 1024
+    login_manager.init_app(limited_app)
+
+    @limited_app.route('/limited_upload', methods=['POST'])
+    @limit_upload_size
+    def limited_upload():
+        upload = ingest_request_upload(request.files['pdf'])
+        return jsonify({"size": upload.size})
+
+    limited_app.teardown_appcontext(close_request_document)
+    return limited_app
+
+def test_anonymous_upload_over_limit_is_rejected(size_limited_app):
+    """Test that anonymous uploads over the free tier size get a 413."""
+    client = size_limited_app.test_client()
+
+    response = client.post('/limited_upload',
+                           data={'pdf': (io.BytesIO(b"%PDF-" + b"x" * (200 * 1024)), 'big.pdf')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 413
+
+def test_anonymous_upload_under_limit_is_accepted(size_limited_app):
+    """Test that uploads within the limit are ingested normally."""
+    client = size_limited_app.test_client()
+
+    response = client.post('/limited_upload',
+                           data={'pdf': (io.BytesIO(b"%PDF-" + b"x" * 1024), 'small.pdf')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert response.get_json()["size"] == 1029
+
+def test_plan_upload_sizes(free_user, starter_user, pro_user):
+    """Test that paid plans allow larger uploads than the free plan."""
+    assert free_user.get_max_upload_size() == 5 * 1024 * 1024
+    assert starter_user.get_max_upload_size() == 10 * 1024 * 1024
+    assert pro_user.get_max_upload_size() == 10 * 1024 * 1024
@@ -0,0 +1,81 @@
+from datetime import date, datetime
+import models.usage
+from models import MonthlyUsage, Upload, DailyUsage
+from extensions import db
+from decorators import record_usage
+
+
+def test_concurrent_increment_is_not_lost(app, free_user, db_session):
+    """Test that an increment made by another worker survives ours."""
+    with app.app_context():
+        user = db_session.merge(free_user)
+        usage = user.get_current_monthly_usage()
+        assert usage.pdf_count == 0
+
+        # Another worker counts three PDFs after we loaded the row
+        db_session.execute(db.text("UPDATE monthly_usage SET pdf_count = pdf_count + 3 WHERE id = :id"),
+                           {"id": usage.id})
+
+        usage.add_usage(pdfs=1, tokens=50)
+        db_session.commit()
+
+        assert (usage.pdf_count, usage.token_count) == (4, 50)
+
+def test_record_usage_commits_once(app, free_user, db_session, monkeypatch):
+    """Test that the upload and both counters are written in one transaction."""
+    with app.app_context():
+        user = db_session.merge(free_user)
+        user.get_current_monthly_usage()
+        commits = []
+        original_commit = db.session.commit
+        monkeypatch.setattr(db.session, 'commit', lambda: commits.append(1) or original_commit())
+
+        record_usage(user, "report.pdf", 3, 120)
+        record_usage(user, "reserved.pdf", 2, 80, count_pdf=False)
+
+        usage = MonthlyUsage.query.filter_by(user_id=user.id).one()
+        assert len(commits) == 2
+        assert (usage.pdf_count, usage.token_count) == (1, 200)
+        assert Upload.query.filter_by(user_id=user.id).count() == 2
+
+def add_upload(user, tokens, when):
+    """Insert an upload row directly, as history recorded before the rollup."""
+    db.session.add(Upload(user_id=user.id, filename="old.pdf", page_count=1,
+                          token_count=tokens, upload_date=when))
+    db.session.commit()
+
+def test_daily_usage_is_summed_in_sql(app, free_user, db_session, monkeypatch):
+    """Test the SQL sum over one day's uploads when the rollup is off."""
+    monkeypatch.setattr(models.usage, 'DAILY_USAGE_ROLLUP', False)
+    with app.app_context():
+        user = db_session.merge(free_user)
+        usage = user.get_current_monthly_usage()
+        add_upload(user, 100, datetime(2026, 3, 1, 9))
+        add_upload(user, 50, datetime(2026, 3, 1, 23, 59, 59, 999999))
+        add_upload(user, 70, datetime(2026, 3, 2, 0))
+
+        assert usage.get_daily_token_usage(date(2026, 3, 1)) == 150
+        assert usage.get_daily_token_usage(date(2026, 3, 3)) == 0
+
+def test_daily_rollup_is_seeded_and_kept_up_to_date(app, free_user, db_session):
+    """Test that the rollup includes earlier uploads and every recorded one."""
+    with app.app_context():
+        user = db_session.merge(free_user)
+        usage = user.get_current_monthly_usage()
+        add_upload(user, 100, datetime.utcnow())
+
+        record_usage(user, "a.pdf", 1, 20)
+        record_usage(user, "b.pdf", 1, 30)
+
+        today = datetime.utcnow().date()
+        assert db_session.get(DailyUsage, (user.id, today)).token_count == 150
+        assert usage.get_daily_token_usage() == 150
+
+def test_daily_sum_uses_covering_index(app):
+    """Test that the daily sum reads only the (user_id, upload_date) index."""
+    with app.app_context():
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT SUM(token_count) FROM upload "
+            "WHERE user_id = 'u' AND upload_date >= '2026-03-01' AND upload_date < '2026-03-02'")).all()
+
+        assert "COVERING INDEX ix_upload_user_id_upload_date" in " ".join(row[-1] for row in plan)
@@ -0,0 +1,54 @@
+import os
+from utils.jobs import QUEUED, DONE, FAILED
+
+# Most files accepted in one batch request
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 20))
+
+# Pipeline stages an item passes through between QUEUED and DONE or FAILED
+EXTRACTING = 'extracting'
+SUMMARIZING = 'summarizing'
+
+
+def item_to_dict(item):
+    """
+    Progress and result fields of one batch item for the status endpoint.
+
+    Args:
+        item (Summary): The item's row; its text is only read once done
+    """
+    return {
+        'index': item.batch_index,
+        'filename': item.filename,
+        'status': item.status,
+        'page_count': item.page_count,
+        'token_count': item.token_count,
+        'summary': item.text if item.status == DONE else None,
+        'error': item.error,
+    }
+
+
+def batch_to_dict(batch_id, items):
+    """
+    Overall progress of a batch plus every item's status.
+
+    Items are Summary rows sharing a batch_id, so any worker can report on
+    a batch whichever worker is processing it.
+
+    Args:
+        batch_id (str): ID of the batch
+        items (list): The batch's Summary rows in batch_index order
+
+    Returns:
+        dict: Status payload for the batch status endpoint
+    """
+    counts = {}
+    for item in items:
+        counts[item.status] = counts.get(item.status, 0) + 1
+    finished = all(item.status in (DONE, FAILED) for item in items)
+    return {
+        'id': batch_id,
+        'status': DONE if finished else 'processing',
+        'total': len(items),
+        'counts': counts,
+        'items': [item_to_dict(item) for item in items],
+    }
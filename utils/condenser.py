@@ -0,0 +1,236 @@
+import os
+import re
+import math
+import time
+from collections import Counter
+from utils.scheduler import parse_plan_values
+from utils.token_counter import count_tokens
+
+try:
+    import numpy
+except ImportError:  # in requirements.txt; the pure-Python ranking gives the same result
+    numpy = None
+
+# Token budget the extractive stage condenses documents to, per plan. Plans
+# left out (or set to 0) send the whole document to the LLM.
+DEFAULT_BUDGETS = {'free': 2000}
+
+# TextRank damping factor and power-iteration limits
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])["\')\]]*\s+(?=["\'(\[]?[A-Z0-9])')
+_TERM_RE = re.compile(r'[a-z][a-z0-9]+|\d+(?:[.,]\d+)*')
+
+_STOPWORDS = frozenset("""
+    a an and are as at be been but by can could did do does for from had has have he her his
+    how if in into is it its may might more most not of on or our she should so such than that
+    the their them then there these they this those to was we were what when where which while
+    who will with would you your also any all each other only over same some very
+""".split())
+
+
+class CondensationReport:
+    """What the extractive stage kept of a document, and how long it took."""
+
+    def __init__(self, text, sentences_before, sentences_after, tokens_before, tokens_after, seconds):
+        self.text = text
+        self.sentences_before = sentences_before
+        self.sentences_after = sentences_after
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.seconds = seconds
+
+    @property
+    def compression_ratio(self):
+        """Share of the document's tokens that are still sent to the LLM"""
+        return self.tokens_after / self.tokens_before if self.tokens_before else 1.0
+
+    @property
+    def tokens_saved(self):
+        """Tokens no longer sent to the LLM"""
+        return self.tokens_before - self.tokens_after
+
+
+def get_condense_budget(plan):
+    """
+    Get the token budget long documents are condensed to for a plan.
+
+    Budgets come from SUMMARY_CONDENSE_TOKENS, e.g. "free:2000,starter:6000".
+
+    Returns:
+        int: Token budget, or None to send the whole document
+    """
+    budgets = parse_plan_values(os.environ.get('SUMMARY_CONDENSE_TOKENS'), DEFAULT_BUDGETS, cast=int)
+    return budgets.get(plan) or None
+
+
+def split_sentences(text):
+    """
+    Split text into sentences, remembering which paragraph each came from.
+
+    Returns:
+        list: (paragraph index, sentence) pairs in document order
+    """
+    sentences = []
+    for index, paragraph in enumerate(_PARAGRAPH_RE.split(text)):
+        paragraph = " ".join(paragraph.split())
+        sentences.extend((index, sentence) for sentence in _SENTENCE_RE.split(paragraph) if sentence)
+    return sentences
+
+
+def _tfidf(sentences):
+    """
+    L2-normalized TF-IDF vectors of the sentences in sparse (COO) form.
+
+    Returns:
+        tuple: (rows, columns, values, number of terms)
+    """
+    counts = []
+    for sentence in sentences:
+        terms = [term for term in _TERM_RE.findall(sentence.lower()) if term not in _STOPWORDS]
+        counts.append(Counter(terms))
+
+    document_frequency = Counter(term for terms in counts for term in terms)
+    columns_by_term = {term: column for column, term in enumerate(document_frequency)}
+    total = len(sentences)
+
+    rows, columns, values = [], [], []
+    for row, terms in enumerate(counts):
+        weights = {term: (1 + math.log(count)) * (1 + math.log(total / document_frequency[term]))
+                   for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        for term, weight in weights.items():
+            rows.append(row)
+            columns.append(columns_by_term[term])
+            values.append(weight / norm)
+    return rows, columns, values, len(columns_by_term)
+
+
+def _rank_numpy(rows, columns, values, sentence_count, term_count):
+    """
+    TextRank scores over the cosine-similarity graph, vectorized with NumPy.
+
+    The similarity matrix S = V V^T - I is never built. Each power iteration
+    multiplies by V^T and then V in sparse form, so memory and time are
+    linear in the number of terms rather than quadratic in sentences.
+    """
+    rows = numpy.asarray(rows, dtype=numpy.intp)
+    columns = numpy.asarray(columns, dtype=numpy.intp)
+    values = numpy.asarray(values, dtype=numpy.float64)
+
+    def similarity(vector):
+        # S x = V (V^T x) - x
+        projected = numpy.bincount(columns, weights=values * vector[rows], minlength=term_count)
+        return numpy.bincount(rows, weights=values * projected[columns], minlength=sentence_count) - vector
+
+    has_terms = numpy.bincount(rows, minlength=sentence_count) > 0
+    degree = similarity(has_terms.astype(numpy.float64))
+    inverse_degree = numpy.divide(1.0, degree, out=numpy.zeros_like(degree), where=degree > 1e-12)
+
+    scores = numpy.full(sentence_count, 1.0 / sentence_count)
+    for _ in range(MAX_ITERATIONS):
+        # S is symmetric, so walking the row-normalized graph is S (p / degree)
+        updated = (1 - DAMPING) / sentence_count + DAMPING * similarity(scores * inverse_degree)
+        if numpy.abs(updated - scores).sum() < TOLERANCE:
+            scores = updated
+            break
+        scores = updated
+    return scores.tolist()
+
+
+def _rank_python(rows, columns, values, sentence_count, term_count):
+    """TextRank scores computed like _rank_numpy, without NumPy"""
+    entries = list(zip(rows, columns, values))
+
+    def similarity(vector):
+        projected = [0.0] * term_count
+        for row, column, value in entries:
+            projected[column] += value * vector[row]
+        result = [-x for x in vector]
+        for row, column, value in entries:
+            result[row] += value * projected[column]
+        return result
+
+    has_terms = [0.0] * sentence_count
+    for row in rows:
+        has_terms[row] = 1.0
+    degree = similarity(has_terms)
+    inverse_degree = [1.0 / d if d > 1e-12 else 0.0 for d in degree]
+
+    scores = [1.0 / sentence_count] * sentence_count
+    for _ in range(MAX_ITERATIONS):
+        walked = similarity([s * w for s, w in zip(scores, inverse_degree)])
+        updated = [(1 - DAMPING) / sentence_count + DAMPING * x for x in walked]
+        change = sum(abs(a - b) for a, b in zip(updated, scores))
+        scores = updated
+        if change < TOLERANCE:
+            break
+    return scores
+
+
+def rank_sentences(sentences):
+    """
+    Score sentences by TextRank centrality over TF-IDF cosine similarity.
+
+    Sentences that share many distinctive terms with the rest of the
+    document score highest; boilerplate and asides score lowest.
+
+    Args:
+        sentences (list): Sentence strings
+
+    Returns:
+        list: One score per sentence
+    """
+    if not sentences:
+        return []
+    rows, columns, values, term_count = _tfidf(sentences)
+    rank = _rank_numpy if numpy is not None else _rank_python
+    return rank(rows, columns, values, len(sentences), term_count)
+
+
+def condense_text(text, max_tokens):
+    """
+    Keep the most central sentences of a document within a token budget.
+
+    Sentences are taken in score order while they fit the budget, then put
+    back in their original order, with paragraph breaks preserved. Text
+    that already fits is returned unchanged.
+
+    Args:
+        text (str): The document text
+        max_tokens (int): Token budget for the condensed text
+
+    Returns:
+        CondensationReport: The condensed text and what was cut
+    """
+    start = time.perf_counter()
+    tokens_before = count_tokens(text)
+    sentences = split_sentences(text)
+    if tokens_before <= max_tokens:
+        return CondensationReport(text, len(sentences), len(sentences),
+                                  tokens_before, tokens_before, time.perf_counter() - start)
+
+    scores = rank_sentences([sentence for _, sentence in sentences])
+    kept, used = [], 0
+    for index in sorted(range(len(sentences)), key=lambda i: -scores[i]):
+        # One token for the space or break joining it to its neighbour
+        cost = count_tokens(sentences[index][1]) + 1
+        if used + cost <= max_tokens:
+            kept.append(index)
+            used += cost
+
+    parts = []
+    previous_paragraph = None
+    for index in sorted(kept):
+        paragraph, sentence = sentences[index]
+        if previous_paragraph is not None:
+            parts.append(" " if paragraph == previous_paragraph else "\n\n")
+        parts.append(sentence)
+        previous_paragraph = paragraph
+    condensed = "".join(parts)
+
+    return CondensationReport(condensed, len(sentences), len(kept), tokens_before,
+                              count_tokens(condensed), time.perf_counter() - start)
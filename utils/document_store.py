@@ -0,0 +1,173 @@
+import os
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+from utils.storage_codec import compress_text, decompress_text
+
+DEFAULT_STORE_PATH = os.path.join(tempfile.gettempdir(), 'pending_documents.sqlite3')
+
+# Uploaded text waits this long for the user to log in and summarize it
+DEFAULT_TTL = 3600
+
+# How often the background sweeper deletes expired documents
+DEFAULT_SWEEP_INTERVAL = 60
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+class PendingDocument:
+    """Extracted text of an upload waiting to be summarized."""
+
+    def __init__(self, doc_id, filename, page_count, text):
+        self.id = doc_id
+        self.filename = filename
+        self.page_count = page_count
+        self.text = text
+
+
+class DocumentStore:
+    """
+    Server-side store for extracted text between upload and summary.
+
+    The session only carries the document ID, so the text never travels in
+    the session cookie. Documents are kept compressed in a SQLite file
+    shared by every worker on the host, and expire ttl seconds after they
+    are stored. Expired rows are never returned, and a background sweeper
+    deletes them.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            ' id TEXT PRIMARY KEY,'
+            ' filename TEXT NOT NULL,'
+            ' page_count INTEGER NOT NULL,'
+            ' body BLOB NOT NULL,'
+            ' raw_size INTEGER NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_documents_expires_at ON documents (expires_at)')
+
+    def put(self, text, filename, page_count=0):
+        """
+        Store a document's text.
+
+        Args:
+            text (str): The extracted text
+            filename (str): Name of the uploaded file
+            page_count (int): Pages in the PDF
+
+        Returns:
+            str: Opaque ID to keep in the session
+        """
+        doc_id = uuid.uuid4().hex
+        body = compress_text(text)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO documents (id, filename, page_count, body, raw_size, expires_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (doc_id, filename, page_count, body, len(text.encode('utf-8')), time.time() + self.ttl))
+        return doc_id
+
+    def get(self, doc_id):
+        """
+        Load a stored document.
+
+        Returns:
+            PendingDocument: The document, or None if it is unknown or expired
+        """
+        if not doc_id:
+            return None
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    'SELECT filename, page_count, body FROM documents WHERE id = ? AND expires_at > ?',
+                    (doc_id, time.time())).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading document store: {str(e)}")
+                return None
+        if row is None:
+            return None
+        return PendingDocument(doc_id, row[0], row[1], decompress_text(row[2]))
+
+    def delete(self, doc_id):
+        """Remove a document once it has been summarized"""
+        with self._lock:
+            try:
+                self._conn.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
+            except sqlite3.Error as e:
+                print(f"Error deleting from document store: {str(e)}")
+
+    def sweep(self):
+        """
+        Delete expired documents.
+
+        Returns:
+            int: Number of documents removed
+        """
+        with self._lock:
+            try:
+                return self._conn.execute('DELETE FROM documents WHERE expires_at <= ?',
+                                          (time.time(),)).rowcount
+            except sqlite3.Error as e:
+                print(f"Error sweeping document store: {str(e)}")
+                return 0
+
+    def start_sweeper(self, interval=DEFAULT_SWEEP_INTERVAL):
+        """Sweep expired documents every interval seconds on a daemon thread"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name='document-store-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """Stop the background sweeper"""
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+        self._stop.clear()
+
+    def stats(self):
+        """Get the number of stored documents and their raw and compressed size"""
+        with self._lock:
+            entries, stored_bytes, raw_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0), COALESCE(SUM(raw_size), 0)'
+                ' FROM documents').fetchone()
+        return {
+            'entries': entries,
+            'stored_bytes': stored_bytes,
+            'raw_bytes': raw_bytes,
+            'compression_ratio': raw_bytes / stored_bytes if stored_bytes else 0.0,
+            'ttl': self.ttl,
+        }
+
+
+def get_document_store():
+    """Get the process-wide document store, starting its sweeper on first use"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = DocumentStore(
+                path=os.environ.get('DOCUMENT_STORE_PATH', DEFAULT_STORE_PATH),
+                ttl=int(os.environ.get('DOCUMENT_STORE_TTL', DEFAULT_TTL)),
+            )
+            _default_store.start_sweeper(
+                int(os.environ.get('DOCUMENT_STORE_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)))
+        return _default_store
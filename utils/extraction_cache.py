@@ -0,0 +1,116 @@
+import os
+import json
+import tempfile
+import threading
+from utils.storage_codec import compress_text, decompress_text
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pdf_text_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_default_cache = None
+
+
+class ExtractionCache:
+    """
+    On-disk cache of per-page PDF text keyed by the SHA-256 of the PDF bytes.
+
+    Each entry is one compressed JSON file, so several times more documents
+    fit in max_bytes. Reads refresh the file's modification time,
+    and once the directory grows past max_bytes the least recently used
+    entries are deleted.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up the pages cached for a document hash.
+
+        Returns:
+            list: (page_number, text) tuples, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                pages = [tuple(page) for page in json.loads(decompress_text(file.read()))['pages']]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return pages
+
+    def put(self, key, pages):
+        """Store the pages for a document hash, evicting old entries if needed"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(compress_text(json.dumps({'pages': pages})))
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                total -= size
+
+    def stats(self):
+        """Get hit/miss counters and the current size of the cache"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+def get_extraction_cache():
+    """Get the process-wide extraction cache configured from the environment"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ExtractionCache(
+            directory=os.environ.get('PDF_CACHE_DIR', DEFAULT_CACHE_DIR),
+            max_bytes=int(os.environ.get('PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        )
+    return _default_cache
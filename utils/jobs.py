@@ -0,0 +1,233 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from utils.scheduler import PriorityScheduler, get_scheduler
+
+# Summaries run on this many threads, independent of the web workers
+JOB_WORKERS = int(os.environ.get('SUMMARY_JOB_WORKERS', 4))
+
+# Finished jobs are forgotten this many seconds after they complete
+JOB_RESULT_TTL = int(os.environ.get('SUMMARY_JOB_RESULT_TTL', 3600))
+
+# Each process reports its unfinished jobs alive this often...
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('SUMMARY_JOB_HEARTBEAT_INTERVAL', 30))
+
+# ...and a job not reported for this many seconds is assumed lost with its process
+JOB_STALE_AFTER = float(os.environ.get('SUMMARY_JOB_STALE_AFTER', 300))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+logger = logging.getLogger(__name__)
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+# The job each worker thread is running, for current_job()
+_local = threading.local()
+
+
+class Job:
+    """One unit of background work and its outcome."""
+
+    def __init__(self, job_id, user_id=None, label=None, plan='free'):
+        self.id = job_id
+        self.user_id = user_id
+        self.label = label
+        self.plan = plan
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._updates = []
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        """Whether the job has succeeded or failed"""
+        return self.status in (DONE, FAILED)
+
+    def publish(self, update):
+        """Make a progress update (e.g. the next piece of a summary) available to followers"""
+        with self._changed:
+            self._updates.append(update)
+            self._changed.notify_all()
+
+    def follow(self, timeout, start=0):
+        """
+        Yield the job's updates as they are published, starting from the first.
+
+        Yields None whenever timeout seconds pass without an update, so a
+        caller relaying them can send keep-alives, and stops once the job
+        has finished and every update has been yielded. A follower that
+        reconnects passes start, the number of updates it already has, to
+        resume where it left off.
+        """
+        position = start
+        while True:
+            with self._changed:
+                if position == len(self._updates) and not self.finished:
+                    self._changed.wait(timeout)
+                updates = self._updates[position:]
+                finished = self.finished
+            position += len(updates)
+            if updates:
+                yield from updates
+            elif finished:
+                return
+            else:
+                yield None
+
+    def _finish(self, status):
+        """Record the outcome and wake any followers"""
+        with self._changed:
+            self.status = status
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def to_dict(self):
+        """Status fields safe to return to the job's owner"""
+        return {
+            'id': self.id,
+            'label': self.label,
+            'plan': self.plan,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs slow work on in-process threads and tracks it by ID.
+
+    Request handlers submit a job and return straight away; clients poll
+    the job's status or follow the updates it publishes. Jobs are started in plan priority order by a
+    PriorityScheduler. Jobs given an app run inside its app context, so
+    they can use the database like a request would.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL, scheduler=None):
+        self.result_ttl = result_ttl
+        self.scheduler = scheduler or PriorityScheduler(max_workers, name='summary-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._beat = None
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    def submit(self, fn, *args, app=None, job_id=None, user_id=None, label=None, plan='free',
+               scheduler=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs) to run in the background.
+
+        Args:
+            fn (callable): The work to run; its return value is the result
+            app (Flask): App whose context the job runs in, if any
+            job_id (str): ID to give the job; a new UUID by default
+            user_id (str): Owner of the job, checked when it is polled
+            label (str): Short description shown while the job runs
+            plan (str): Plan of the job's owner, which sets its priority
+            scheduler (PriorityScheduler): Scheduler to run the job on
+                instead of the manager's own, e.g. the extraction slots
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(job_id or str(uuid.uuid4()), user_id=user_id, label=label, plan=plan)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        (scheduler or self.scheduler).submit(self._run, job, app, fn, args, kwargs, plan=plan)
+        return job
+
+    def get(self, job_id):
+        """Get a job by ID, or None if it is unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def start_heartbeat(self, beat, interval=JOB_HEARTBEAT_INTERVAL):
+        """
+        Report this process's unfinished jobs alive every interval seconds.
+
+        Jobs only live in this process's memory, so other workers (and this
+        one after a restart) tell a lost job from a slow one by how long it
+        has gone without a heartbeat. Calling this again replaces beat.
+
+        Args:
+            beat (callable): Called with the IDs of the queued and running jobs
+            interval (float): Seconds between heartbeats
+        """
+        with self._lock:
+            self._beat = beat
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._send_heartbeats, args=(interval,),
+                                                   name='summary-job-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _send_heartbeats(self, interval):
+        """Call the heartbeat with the unfinished jobs until shutdown"""
+        while not self._stopped.wait(interval):
+            with self._lock:
+                job_ids = [job.id for job in self._jobs.values() if not job.finished]
+                beat = self._beat
+            if not job_ids:
+                continue
+            try:
+                beat(job_ids)
+            except Exception as e:
+                logger.exception(f"Job heartbeat failed: {str(e)}")
+
+    def _run(self, job, app, fn, args, kwargs):
+        """Run one job, recording its result or error"""
+        job.status = RUNNING
+        job.started_at = time.time()
+        _local.job = job
+        try:
+            if app is not None:
+                with app.app_context():
+                    job.result = fn(*args, **kwargs)
+            else:
+                job.result = fn(*args, **kwargs)
+            job._finish(DONE)
+        except Exception as e:
+            logger.exception(f"Background job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job._finish(FAILED)
+        finally:
+            _local.job = None
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL; caller holds the lock"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and optionally wait for running ones"""
+        self._stopped.set()
+        self.scheduler.shutdown(wait=wait)
+
+
+def current_job():
+    """Get the job running on this thread, or None outside a job"""
+    return getattr(_local, 'job', None)
+
+
+def get_job_manager():
+    """Get the process-wide job manager, configured from the environment"""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager(scheduler=get_scheduler('summarize', JOB_WORKERS))
+        return _default_manager
@@ -0,0 +1,416 @@
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from utils.token_counter import count_tokens, count_chat_tokens
+
+_SENTENCE_RE = re.compile(r'[^.!?\n]+[.!?]?')
+
+# Most LLM calls in flight per process; callers beyond this wait their turn
+MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+
+# Seconds before one API request is abandoned
+REQUEST_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 60))
+
+# Retries after a 429, a 5xx or a connection error, with exponential backoff
+MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 20))
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+class LLMBackendError(Exception):
+    """Raised when a backend fails to produce a completion"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CompletionResult:
+    """Text of one chat completion and the tokens it was billed for."""
+
+    def __init__(self, text, prompt_tokens, completion_tokens):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class LLMBackend:
+    """
+    Interface every chat completion backend implements.
+
+    Subclasses override complete(); callers never touch a vendor SDK.
+    """
+
+    name = None
+
+    def complete(self, messages, model, max_tokens, temperature=0.5):
+        """
+        Run one chat completion.
+
+        Args:
+            messages (list): Chat messages as {"role", "content"} dicts
+            model (str): Model to use
+            max_tokens (int): Maximum completion length
+            temperature (float): Sampling temperature
+
+        Returns:
+            CompletionResult: The reply text and its token usage
+        """
+        raise NotImplementedError
+
+    def stream(self, messages, model, max_tokens, temperature=0.5):
+        """
+        Run one chat completion, yielding the reply as it is generated.
+
+        Use as ``result = yield from backend.stream(...)``: the generator
+        yields text deltas and returns the CompletionResult. Backends that
+        cannot stream yield the whole reply at once.
+        """
+        result = self.complete(messages, model, max_tokens, temperature)
+        yield result.text
+        return result
+
+    def stats(self):
+        """Get call metrics; plain backends only report their name"""
+        return {'backend': self.name}
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Chat completions through the OpenAI API.
+
+    One client, and so one keep-alive connection pool, is shared by every
+    call. Requests time out after timeout seconds; retries are left to
+    RetryingBackend so they share its backoff and metrics.
+    """
+
+    name = 'openai'
+
+    def __init__(self, api_key=None, timeout=REQUEST_TIMEOUT, max_connections=MAX_CONCURRENCY):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The shared OpenAI client, created on first use"""
+        with self._client_lock:
+            if self._client is None:
+                import httpx
+                import openai
+                http_client = httpx.Client(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections),
+                )
+                self._client = openai.OpenAI(api_key=self.api_key, timeout=self.timeout,
+                                             max_retries=0, http_client=http_client)
+            return self._client
+
+    def complete(self, messages, model, max_tokens, temperature=0.5):
+        import openai
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+        except openai.APIStatusError as e:
+            raise LLMBackendError(str(e), status_code=e.status_code) from e
+        except openai.APIError as e:
+            raise LLMBackendError(str(e)) from e
+
+        usage = response.usage
+        return CompletionResult(
+            text=response.choices[0].message.content.strip(),
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+    def stream(self, messages, model, max_tokens, temperature=0.5):
+        import openai
+        # Streamed responses carry no usage in this SDK, so it is counted locally
+        parts = []
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+            )
+            for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except openai.APIStatusError as e:
+            raise LLMBackendError(str(e), status_code=e.status_code) from e
+        except openai.APIError as e:
+            raise LLMBackendError(str(e)) from e
+
+        text = "".join(parts).strip()
+        return CompletionResult(text, count_chat_tokens(messages, model), count_tokens(text, model))
+
+
+class LocalBackend(LLMBackend):
+    """
+    Offline stand-in for an LLM, for tests, load tests and benchmarks.
+
+    The reply is built from the leading sentences of the prompt's sections,
+    so it is deterministic and its length is proportional to the prompt
+    (summary_ratio of the prompt tokens, capped at max_tokens). Each call
+    sleeps for latency plus completion_tokens / tokens_per_second, give or
+    take up to jitter seconds, and fails with probability error_rate. Token
+    usage is counted with the local tokenizer.
+    """
+
+    name = 'local'
+
+    def __init__(self, latency=0.0, jitter=0.0, tokens_per_second=0, error_rate=0.0,
+                 summary_ratio=0.2, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.summary_ratio = summary_ratio
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _reply(self, prompt, target_tokens, model):
+        """Take leading sentences from each section until target_tokens is reached"""
+        sections = [s for s in prompt.split("\n\n") if s.strip()]
+        # Skip the instruction line that precedes the document text
+        body = [[m.strip() for m in _SENTENCE_RE.findall(section) if m.strip()]
+                for section in (sections[1:] or sections)]
+
+        # First sentence of every section, then the second of every section, ...
+        reply = []
+        tokens = 0
+        for depth in range(max((len(found) for found in body), default=0)):
+            for found in body:
+                if depth >= len(found):
+                    continue
+                sentence_tokens = count_tokens(found[depth], model)
+                if reply and tokens + sentence_tokens > target_tokens:
+                    return " ".join(reply)
+                reply.append(found[depth])
+                tokens += sentence_tokens
+        return " ".join(reply) or hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+    def _plan(self, messages, model, max_tokens):
+        """Decide a call's reply, first-token delay and outcome up front"""
+        prompt_tokens = count_chat_tokens(messages, model)
+        target_tokens = max(1, min(max_tokens, int(prompt_tokens * self.summary_ratio)))
+        text = self._reply(messages[-1]["content"], target_tokens, model)
+        result = CompletionResult(text, prompt_tokens, count_tokens(text, model))
+
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            offset = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return result, max(0.0, self.latency + offset), failed
+
+    def complete(self, messages, model, max_tokens, temperature=0.5):
+        result, delay, failed = self._plan(messages, model, max_tokens)
+        if self.tokens_per_second:
+            delay += result.completion_tokens / self.tokens_per_second
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise LLMBackendError("Simulated backend error", status_code=503)
+        return result
+
+    def stream(self, messages, model, max_tokens, temperature=0.5):
+        result, delay, failed = self._plan(messages, model, max_tokens)
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise LLMBackendError("Simulated backend error", status_code=503)
+
+        # Emit word by word at the simulated generation speed
+        words = result.text.split(" ")
+        for i, word in enumerate(words):
+            if self.tokens_per_second:
+                time.sleep(count_tokens(word, model) / self.tokens_per_second)
+            yield word if i == 0 else " " + word
+        return result
+
+
+class RetryingBackend(LLMBackend):
+    """
+    Wraps a backend with a concurrency limit, retries and call metrics.
+
+    At most max_concurrency calls run at once per process. Calls that fail
+    with a 429, a 5xx or no status at all (timeouts, dropped connections)
+    are retried up to max_retries times, sleeping a random time between
+    zero and backoff_base * 2 ** attempt (capped at backoff_max) first.
+    The slot is released while sleeping so other calls can proceed.
+    """
+
+    def __init__(self, backend, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.backend = backend
+        self.name = backend.name
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+
+    @staticmethod
+    def is_retryable(error):
+        """Whether a failed call is worth retrying"""
+        status = error.status_code
+        return status is None or status == 429 or status >= 500
+
+    def _backoff(self, attempt):
+        """Seconds to wait before retry number attempt (0-based), with full jitter"""
+        return self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def complete(self, messages, model, max_tokens, temperature=0.5):
+        attempt = 0
+        while True:
+            with self._slots:
+                with self._lock:
+                    self.in_flight += 1
+                    self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                    self.calls += 1
+                start = time.monotonic()
+                try:
+                    return self.backend.complete(messages, model, max_tokens, temperature)
+                except LLMBackendError as e:
+                    error = e
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+                        self.total_seconds += time.monotonic() - start
+
+            if attempt >= self.max_retries or not self.is_retryable(error):
+                with self._lock:
+                    self.failures += 1
+                raise error
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def stream(self, messages, model, max_tokens, temperature=0.5):
+        """Stream a completion; only failures before the first delta are retried"""
+        attempt = 0
+        while True:
+            started = False
+            with self._slots:
+                with self._lock:
+                    self.in_flight += 1
+                    self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                    self.calls += 1
+                start = time.monotonic()
+                try:
+                    stream = self.backend.stream(messages, model, max_tokens, temperature)
+                    while True:
+                        try:
+                            delta = next(stream)
+                        except StopIteration as stop:
+                            return stop.value
+                        started = True
+                        yield delta
+                except LLMBackendError as e:
+                    error = e
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+                        self.total_seconds += time.monotonic() - start
+
+            if started or attempt >= self.max_retries or not self.is_retryable(error):
+                with self._lock:
+                    self.failures += 1
+                raise error
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def stats(self):
+        """Get in-flight, retry and failure counters"""
+        with self._lock:
+            return {
+                'backend': self.name,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'max_concurrency': self.max_concurrency,
+                'calls': self.calls,
+                'retries': self.retries,
+                'failures': self.failures,
+                'average_seconds': self.total_seconds / self.calls if self.calls else 0.0,
+            }
+
+
+def create_llm_backend(name=None):
+    """
+    Build a backend from the environment.
+
+    LLM_BACKEND selects 'openai' or 'local'; without it the local backend
+    is used when TESTING is set and OpenAI otherwise. The local backend is
+    tuned with LOCAL_LLM_LATENCY, LOCAL_LLM_JITTER, LOCAL_LLM_TOKENS_PER_SECOND,
+    LOCAL_LLM_ERROR_RATE, LOCAL_LLM_SUMMARY_RATIO and LOCAL_LLM_SEED.
+
+    Args:
+        name (str): Backend name overriding LLM_BACKEND
+
+    Returns:
+        LLMBackend: The configured backend
+    """
+    if name is None:
+        testing = os.environ.get('TESTING', 'False').lower() == 'true'
+        name = os.environ.get('LLM_BACKEND', 'local' if testing else 'openai')
+
+    if name == 'local':
+        return LocalBackend(
+            latency=float(os.environ.get('LOCAL_LLM_LATENCY', 0)),
+            jitter=float(os.environ.get('LOCAL_LLM_JITTER', 0)),
+            tokens_per_second=float(os.environ.get('LOCAL_LLM_TOKENS_PER_SECOND', 0)),
+            error_rate=float(os.environ.get('LOCAL_LLM_ERROR_RATE', 0)),
+            summary_ratio=float(os.environ.get('LOCAL_LLM_SUMMARY_RATIO', 0.2)),
+            seed=int(os.environ.get('LOCAL_LLM_SEED', 0)),
+        )
+    if name == 'openai':
+        return OpenAIBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+def get_llm_backend():
+    """
+    Get the process-wide LLM backend configured from the environment.
+
+    The backend is wrapped in a RetryingBackend, so every summary in the
+    process shares one concurrency limit, retry policy and set of metrics.
+    """
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            _default_backend = RetryingBackend(create_llm_backend())
+        return _default_backend
+
+
+def set_llm_backend(backend):
+    """Replace the process-wide LLM backend, e.g. with a tuned LocalBackend"""
+    global _default_backend
+    with _default_backend_lock:
+        _default_backend = backend
@@ -0,0 +1,239 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+PLANS = ('pro', 'starter', 'free')
+
+# Relative dispatch rates when several plans have work queued: with the
+# defaults a pro task is started four times as often as a free one, but
+# free work is never starved
+DEFAULT_WEIGHTS = {'pro': 4, 'starter': 2, 'free': 1}
+
+# Share of the scheduler's slots each plan may occupy at once
+DEFAULT_SHARES = {'pro': 1.0, 'starter': 0.75, 'free': 0.5}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def parse_plan_values(value, defaults, cast=float):
+    """
+    Parse a "pro:4,starter:2,free:1" setting, falling back to defaults.
+
+    Args:
+        value (str): The setting, or None
+        defaults (dict): Values for plans the setting leaves out
+        cast (callable): Type of each value
+
+    Returns:
+        dict: Value per plan
+    """
+    values = dict(defaults)
+    for item in (value or '').split(','):
+        if ':' in item:
+            plan, number = item.split(':', 1)
+            values[plan.strip()] = cast(number)
+    return values
+
+
+class _Ticket:
+    """A queued request for one slot."""
+
+    def __init__(self, plan, fn=None, args=(), kwargs=None):
+        self.plan = plan
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.future = Future()
+        self.granted = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+class _PlanState:
+    """Queue and counters for one plan."""
+
+    def __init__(self, weight, limit):
+        self.weight = weight
+        self.limit = limit
+        self.queue = deque()
+        self.running = 0
+        self.pass_value = 0.0
+        self.started = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class PriorityScheduler:
+    """
+    Admits work by plan with weighted fair queuing and per-plan caps.
+
+    The scheduler has max_workers slots. Waiting work is kept in one FIFO
+    queue per plan. Whenever a slot frees up, the next task comes from the
+    plan with the lowest pass value, and that plan's pass value then goes
+    up by 1 / weight. Heavier plans are picked proportionally more often,
+    but every plan with queued work is eventually served (stride
+    scheduling). A plan is skipped while it already holds its share of
+    the slots.
+
+    Work enters in one of two ways. submit() queues a callable that runs on
+    the scheduler's own threads. slot() blocks the calling thread until it
+    is granted a slot, so the work keeps running on that thread.
+    """
+
+    def __init__(self, max_workers, weights=None, shares=None, name='scheduler'):
+        self.max_workers = max(1, max_workers)
+        self.name = name
+        weights = weights or DEFAULT_WEIGHTS
+        shares = shares or DEFAULT_SHARES
+        self._plans = {
+            plan: _PlanState(weights.get(plan, 1),
+                             max(1, math.ceil(shares.get(plan, 1.0) * self.max_workers)))
+            for plan in set(PLANS) | set(weights)
+        }
+        self._running = 0
+        self._virtual_time = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix=name)
+
+    def _plan_for(self, plan):
+        """Map unknown or missing plans to the free tier"""
+        return plan if plan in self._plans else 'free'
+
+    def _enqueue(self, ticket):
+        with self._lock:
+            state = self._plans[ticket.plan]
+            if not state.queue:
+                # An idle plan must not bank credit for the time it had nothing queued
+                state.pass_value = max(state.pass_value, self._virtual_time)
+            state.queue.append(ticket)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiting tickets; caller holds the lock"""
+        while self._running < self.max_workers:
+            # Ties go to the heavier plan, so pro work starts first
+            eligible = [(state.pass_value, -state.weight, plan) for plan, state in self._plans.items()
+                        if state.queue and state.running < state.limit]
+            if not eligible:
+                return
+            _, _, plan = min(eligible)
+            state = self._plans[plan]
+            ticket = state.queue.popleft()
+
+            wait = time.monotonic() - ticket.enqueued_at
+            state.started += 1
+            state.total_wait += wait
+            state.max_wait = max(state.max_wait, wait)
+            self._virtual_time = state.pass_value
+            state.pass_value += 1.0 / state.weight
+            state.running += 1
+            self._running += 1
+
+            if ticket.fn is not None:
+                self._executor.submit(self._run, ticket)
+            else:
+                ticket.granted.set()
+
+    def _release(self, plan):
+        with self._lock:
+            self._plans[plan].running -= 1
+            self._running -= 1
+            self._dispatch()
+
+    def _run(self, ticket):
+        if not ticket.future.set_running_or_notify_cancel():
+            self._release(ticket.plan)
+            return
+        try:
+            ticket.future.set_result(ticket.fn(*ticket.args, **ticket.kwargs))
+        except BaseException as e:
+            ticket.future.set_exception(e)
+        finally:
+            self._release(ticket.plan)
+
+    def submit(self, fn, *args, plan='free', **kwargs):
+        """
+        Queue fn(*args, **kwargs) to run on a scheduler thread.
+
+        Args:
+            fn (callable): The work to run
+            plan (str): Plan of the user the work is for
+
+        Returns:
+            Future: Resolves to fn's return value
+        """
+        ticket = _Ticket(self._plan_for(plan), fn, args, kwargs)
+        self._enqueue(ticket)
+        return ticket.future
+
+    def slot(self, plan='free'):
+        """
+        Wait for a slot and hold it on the calling thread.
+
+        Use as ``with scheduler.slot(plan): ...``.
+        """
+        return _Slot(self, self._plan_for(plan))
+
+    def stats(self):
+        """Get queue length, running count and queue-wait times per plan"""
+        with self._lock:
+            plans = {}
+            for plan, state in self._plans.items():
+                plans[plan] = {
+                    'weight': state.weight,
+                    'max_running': state.limit,
+                    'queued': len(state.queue),
+                    'running': state.running,
+                    'started': state.started,
+                    'average_wait_seconds': state.total_wait / state.started if state.started else 0.0,
+                    'max_wait_seconds': state.max_wait,
+                }
+            return {'max_workers': self.max_workers, 'running': self._running, 'plans': plans}
+
+    def shutdown(self, wait=True):
+        """Stop the scheduler's threads"""
+        self._executor.shutdown(wait=wait)
+
+
+class _Slot:
+    """Context manager holding one scheduler slot on the calling thread."""
+
+    def __init__(self, scheduler, plan):
+        self.scheduler = scheduler
+        self.plan = plan
+
+    def __enter__(self):
+        ticket = _Ticket(self.plan)
+        self.scheduler._enqueue(ticket)
+        ticket.granted.wait()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.scheduler._release(self.plan)
+        return False
+
+
+def get_scheduler(name, max_workers):
+    """
+    Get a process-wide scheduler by name, creating it on first use.
+
+    Weights and shares come from SCHEDULER_PLAN_WEIGHTS and
+    SCHEDULER_PLAN_SHARES, e.g. "pro:4,starter:2,free:1".
+
+    Args:
+        name (str): Which scheduler, e.g. 'summarize' or 'extract'
+        max_workers (int): Slots, used only when the scheduler is created
+    """
+    with _schedulers_lock:
+        if name not in _schedulers:
+            _schedulers[name] = PriorityScheduler(
+                max_workers,
+                weights=parse_plan_values(os.environ.get('SCHEDULER_PLAN_WEIGHTS'), DEFAULT_WEIGHTS),
+                shares=parse_plan_values(os.environ.get('SCHEDULER_PLAN_SHARES'), DEFAULT_SHARES),
+                name=name,
+            )
+        return _schedulers[name]
@@ -0,0 +1,271 @@
+import os
+import lzma
+import zlib
+import threading
+from collections import Counter
+
+# zlib only looks back 32 KB, so a larger preset dictionary is never used
+DEFAULT_DICTIONARY_SIZE = 32 * 1024
+
+_codecs = {}
+_decoders = {}
+_dictionaries = {}
+_default_codec = None
+_default_codec_lock = threading.Lock()
+
+
+class Codec:
+    """
+    Compresses stored blobs in one format.
+
+    Every format is recognisable from its first bytes, so a blob can always
+    be decoded, even after the configured codec has changed.
+    """
+
+    name = None
+
+    def compress(self, data):
+        raise NotImplementedError
+
+    def decompress(self, data):
+        raise NotImplementedError
+
+    def matches(self, data):
+        """Whether a blob was written by this codec"""
+        raise NotImplementedError
+
+
+class RawCodec(Codec):
+    """Stores data uncompressed behind a one-byte marker."""
+
+    name = 'none'
+    MARKER = b'\x00'
+
+    def compress(self, data):
+        return self.MARKER + data
+
+    def decompress(self, data):
+        return data[1:]
+
+    def matches(self, data):
+        return data[:1] == self.MARKER
+
+
+class ZlibCodec(Codec):
+    """
+    zlib (DEFLATE), optionally primed with a preset dictionary.
+
+    A dictionary trained on our own documents lets even short summaries
+    reference common phrases. The zlib header records the dictionary's
+    Adler-32, which is used to find it again when decompressing.
+    """
+
+    name = 'zlib'
+
+    def __init__(self, level=6, dictionary=None):
+        self.level = level
+        self.dictionary = dictionary
+        if dictionary:
+            register_dictionary(dictionary)
+
+    def compress(self, data):
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        # FDICT flag in the header byte: the stream needs a preset dictionary
+        if data[1] & 0x20:
+            dictionary_id = int.from_bytes(data[2:6], 'big')
+            if dictionary_id not in _dictionaries:
+                raise ValueError(f"Unknown compression dictionary {dictionary_id:08x}")
+            decompressor = zlib.decompressobj(zdict=_dictionaries[dictionary_id])
+        else:
+            decompressor = zlib.decompressobj()
+        decompressed = decompressor.decompress(data) + decompressor.flush()
+        # A partial stream decodes without error, so check it ended exactly
+        if not decompressor.eof or decompressor.unused_data:
+            raise zlib.error("Incomplete or trailing zlib data")
+        return decompressed
+
+    def matches(self, data):
+        # Deflate method with a valid header checksum
+        return len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0
+
+
+class LzmaCodec(Codec):
+    """xz (LZMA2), for when storage matters more than CPU time."""
+
+    name = 'lzma'
+    MAGIC = b'\xfd7zXZ\x00'
+
+    def __init__(self, preset=6):
+        self.preset = preset
+
+    def compress(self, data):
+        return lzma.compress(data, preset=self.preset)
+
+    def decompress(self, data):
+        return lzma.decompress(data)
+
+    def matches(self, data):
+        return data[:6] == self.MAGIC
+
+
+def register_codec(codec_class):
+    """
+    Make a codec selectable with STORAGE_CODEC and decodable on read.
+
+    Args:
+        codec_class (type): Codec subclass with a unique name, whose default
+            instance can decompress anything the codec writes
+    """
+    _codecs[codec_class.name] = codec_class
+    _decoders[codec_class.name] = codec_class()
+    return codec_class
+
+
+def register_dictionary(dictionary):
+    """Make a preset dictionary available for decompressing blobs that used it"""
+    _dictionaries[zlib.adler32(dictionary)] = dictionary
+
+
+for _codec_class in (RawCodec, ZlibCodec, LzmaCodec):
+    register_codec(_codec_class)
+
+
+def train_dictionary(samples, size=DEFAULT_DICTIONARY_SIZE):
+    """
+    Build a zlib preset dictionary from sample documents.
+
+    Phrases of one to four words are scored by how many bytes they would
+    save across the samples. The best are packed in, most valuable last,
+    because zlib matches recent dictionary bytes with shorter distances.
+
+    Args:
+        samples (list): Representative texts, e.g. recent summaries
+        size (int): Maximum dictionary size in bytes
+
+    Returns:
+        bytes: The dictionary
+    """
+    counts = Counter()
+    for sample in samples:
+        words = sample.split()
+        for length in range(1, 5):
+            for start in range(len(words) - length + 1):
+                counts[" ".join(words[start:start + length])] += 1
+
+    # A phrase that is seen once is never worth a slot
+    scored = sorted(((count * len(phrase), phrase) for phrase, count in counts.items()
+                     if count > 1 and len(phrase) > 3), reverse=True)
+
+    chosen, used = [], 0
+    for _, phrase in scored:
+        encoded = phrase.encode('utf-8') + b' '
+        if used + len(encoded) > size:
+            continue
+        # Skip phrases already covered by a longer chosen one
+        if any(phrase in longer for longer in chosen[-64:]):
+            continue
+        chosen.append(phrase)
+        used += len(encoded)
+    return b" ".join(phrase.encode('utf-8') for phrase in reversed(chosen))
+
+
+def create_codec(name='zlib', level=None, dictionary=None):
+    """
+    Build a codec by name.
+
+    Args:
+        name (str): 'zlib', 'lzma', 'none' or a registered codec's name
+        level (int): Compression level or preset, if the codec has one
+        dictionary (bytes): Preset dictionary, for zlib
+
+    Raises:
+        ValueError: If no codec has that name
+    """
+    if name not in _codecs:
+        raise ValueError(f"Unknown storage codec: {name}")
+    if name == 'zlib':
+        return ZlibCodec(level if level is not None else 6, dictionary)
+    if name == 'lzma':
+        return LzmaCodec(level if level is not None else 6)
+    return _codecs[name]()
+
+
+def get_storage_codec():
+    """
+    Get the process-wide codec configured from the environment.
+
+    STORAGE_CODEC picks the format and STORAGE_CODEC_LEVEL its level.
+    STORAGE_CODEC_DICTIONARY is a comma-separated list of dictionaries
+    written by train_dictionary: the first is used to compress, and all
+    of them can decompress, so older dictionaries can be retired slowly.
+    """
+    global _default_codec
+    with _default_codec_lock:
+        if _default_codec is None:
+            dictionaries = []
+            for path in filter(None, os.environ.get('STORAGE_CODEC_DICTIONARY', '').split(',')):
+                try:
+                    with open(path.strip(), 'rb') as file:
+                        dictionaries.append(file.read())
+                except OSError as e:
+                    print(f"Error loading compression dictionary: {str(e)}")
+            for dictionary in dictionaries:
+                register_dictionary(dictionary)
+            dictionary = dictionaries[0] if dictionaries else None
+            level = os.environ.get('STORAGE_CODEC_LEVEL')
+            _default_codec = create_codec(os.environ.get('STORAGE_CODEC', 'zlib'),
+                                          int(level) if level else None, dictionary)
+        return _default_codec
+
+
+def compress_text(text, codec=None):
+    """
+    Encode text for storage.
+
+    Args:
+        text (str): The text
+        codec (Codec): Codec to use (defaults to get_storage_codec())
+
+    Returns:
+        bytes: The compressed blob
+    """
+    return (codec or get_storage_codec()).compress(text.encode('utf-8'))
+
+
+def decompress_text(blob):
+    """
+    Decode a blob written by compress_text with any codec.
+
+    Plain strings and unrecognised bytes, such as rows written before
+    compression was enabled, are returned as text unchanged. Formats are
+    told apart by only a few bytes, so plain text that happens to start
+    like a compressed blob (b'x is a variable' looks like zlib) is also
+    returned unchanged when it does not decompress.
+
+    Raises:
+        ValueError, zlib.error, lzma.LZMAError: If a compressed blob cannot
+            be decoded and is not plain text either
+
+    Returns:
+        str: The text
+    """
+    if blob is None or isinstance(blob, str):
+        return blob
+    blob = bytes(blob)
+    for decoder in _decoders.values():
+        if decoder.matches(blob):
+            try:
+                return decoder.decompress(blob).decode('utf-8')
+            except (ValueError, zlib.error, lzma.LZMAError):
+                try:
+                    return blob.decode('utf-8')
+                except UnicodeDecodeError:
+                    pass
+                raise
+    return blob.decode('utf-8')
@@ -1,45 +1,290 @@
 import os
-import openai
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.token_counter import count_tokens, count_chat_tokens, fits_context
+from utils.summary_cache import get_summary_cache, summary_cache_key
+from utils.llm_backends import get_llm_backend
+from utils.condenser import condense_text
 
 # Load environment variables
 load_dotenv()
 
-# Set OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
 
-def generate_summary(text, max_tokens=500):
+SYSTEM_PROMPT = "You are a helpful assistant that summarizes PDF documents."
+SUMMARY_PROMPT = "Please summarize the following text in a concise, well-structured format. Focus on the key points and main ideas:\n\n{text}"
+SECTION_PROMPT = "Summarize this section of a longer document. Keep every key point, figure and conclusion, and drop everything else:\n\n{text}"
+COMBINE_PROMPT = "The following are summaries of consecutive sections of one document. Combine them into a single concise, well-structured summary focused on the key points and main ideas:\n\n{text}"
+
+# Documents up to this many tokens are summarized in a single call; longer
+# ones are split into chunks of at most CHUNK_TOKENS and map-reduced
+SINGLE_PASS_TOKENS = int(os.environ.get('SUMMARY_SINGLE_PASS_TOKENS', 3000))
+CHUNK_TOKENS = int(os.environ.get('SUMMARY_CHUNK_TOKENS', 2500))
+
+# Length of each partial summary produced while map-reducing
+PARTIAL_SUMMARY_TOKENS = 300
+
+# Maximum number of LLM calls in flight for one document
+MAX_CONCURRENCY = int(os.environ.get('SUMMARY_MAX_CONCURRENCY', 4))
+
+MODEL = "gpt-3.5-turbo"
+
+
+def _messages(prompt):
+    """Chat messages for one summarization prompt"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _complete(prompt, max_tokens, usage=None):
+    """
+    Send one summarization prompt to the model and return the reply text.
+
+    The call goes to the configured LLM backend (see utils.llm_backends);
+    the prompt and completion tokens it reports are added to usage, if given.
     """
-    Generate a summary of the provided text using OpenAI's GPT model.
-    
+    result = get_llm_backend().complete(_messages(prompt), MODEL, max_tokens, temperature=0.5)
+    if usage is not None:
+        usage.add(result.prompt_tokens, result.completion_tokens)
+    return result.text
+
+
+def predict_prompt_tokens(text):
+    """
+    Predict the prompt tokens a single-pass summary of text would send.
+
+    Args:
+        text (str): The text to summarize
+
+    Returns:
+        int: Prompt tokens, including the system prompt and chat framing
+    """
+    return count_chat_tokens(_messages(SUMMARY_PROMPT.format(text=text)), MODEL)
+
+
+def _split_oversized(paragraph, max_tokens):
+    """Split a paragraph that alone exceeds max_tokens, on sentences if possible"""
+    pieces = []
+    current = ""
+    for sentence in paragraph.replace(". ", ".\n").split("\n"):
+        while count_tokens(sentence) > max_tokens:
+            # No sentence boundary to use; cut on the character budget
+            cut = max_tokens * 4
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        candidate = f"{current} {sentence}".strip()
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS):
+    """
+    Split text into chunks of at most max_tokens on paragraph boundaries.
+
+    Extracted pages are separated by blank lines, so page and paragraph
+    boundaries are both respected; only a single paragraph longer than the
+    budget is split further.
+
+    Args:
+        text (str): The text to split
+        max_tokens (int): Token budget per chunk
+
+    Returns:
+        list: Chunks in document order
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens > max_tokens:
+            pieces = _split_oversized(paragraph, max_tokens)
+        else:
+            pieces = [paragraph]
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _reduce(text, chunk_tokens, max_concurrency, usage):
+    """
+    Map-reduce text down to the prompt for the final summary call.
+
+    Returns:
+        str: A COMBINE_PROMPT holding one batch of partial summaries
+    """
+    if max_concurrency is None:
+        max_concurrency = MAX_CONCURRENCY
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        chunks = chunk_text(text, chunk_tokens)
+        summaries = list(executor.map(
+            lambda chunk: _complete(SECTION_PROMPT.format(text=chunk), PARTIAL_SUMMARY_TOKENS, usage),
+            chunks))
+
+        while True:
+            groups = chunk_text("\n\n".join(summaries), chunk_tokens)
+            if len(groups) >= len(summaries) > 1:
+                # Budget too small to batch summaries; pair them so each level shrinks
+                groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+            if len(groups) == 1 or len(summaries) == 1:
+                return COMBINE_PROMPT.format(text="\n\n".join(groups))
+            summaries = list(executor.map(
+                lambda group: _complete(COMBINE_PROMPT.format(text=group), PARTIAL_SUMMARY_TOKENS, usage),
+                groups))
+
+
+def summarize_map_reduce(text, max_tokens=500, chunk_tokens=CHUNK_TOKENS, max_concurrency=None, usage=None):
+    """
+    Summarize a long document by summarizing chunks and then the summaries.
+
+    Chunks are summarized concurrently (map). The partial summaries are
+    then grouped into chunk-sized batches and summarized again, level by
+    level, until one batch remains for the final summary (reduce). Wall
+    time grows with the depth of that tree rather than with the length of
+    the document.
+
+    Args:
+        text (str): The text to summarize
+        max_tokens (int): Maximum length of the final summary
+        chunk_tokens (int): Token budget for each prompt's text
+        max_concurrency (int): Maximum LLM calls in flight
+        usage (TokenUsage): Tally to add every call's token usage to
+
+    Returns:
+        str: The generated summary
+    """
+    return _complete(_reduce(text, chunk_tokens, max_concurrency, usage), max_tokens, usage)
+
+
+def _final_prompt(text, max_tokens, max_concurrency, usage):
+    """The prompt for the call that writes the summary, map-reducing long text first"""
+    # Long documents would overflow the context window in one prompt
+    prompt_tokens = predict_prompt_tokens(text)
+    if prompt_tokens > SINGLE_PASS_TOKENS or not fits_context(prompt_tokens, max_tokens, MODEL):
+        return _reduce(text, CHUNK_TOKENS, max_concurrency, usage)
+    return SUMMARY_PROMPT.format(text=text)
+
+
+def _condense(text, condense_tokens):
+    """Cut text to its most central sentences when a budget is set"""
+    if not condense_tokens:
+        return text
+    report = condense_text(text, condense_tokens)
+    if report.tokens_saved:
+        logger.info(f"Condensed document from {report.tokens_before} to {report.tokens_after} tokens "
+                    f"({report.compression_ratio:.0%}, {report.sentences_after}/{report.sentences_before} "
+                    f"sentences) in {report.seconds * 1000:.0f}ms")
+    return report.text
+
+
+def summarize_text(text, max_tokens=500, max_concurrency=None, usage=None,
+                   document_type=None, summary_format=None, use_cache=True, condense_tokens=None):
+    """
+    Summarize text like generate_summary, but let errors propagate.
+
+    For callers that must tell a failed summary from a real one, such as
+    batch processing, which marks the item failed and releases its quota.
+
+    Raises:
+        LLMBackendError: If a model call fails after retries
+    """
+    # Identical text and options get the stored summary without an LLM call
+    cache = get_summary_cache() if use_cache else None
+    if cache is not None:
+        key = summary_cache_key(text, MODEL, document_type, summary_format, max_tokens, condense_tokens)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    text = _condense(text, condense_tokens)
+    summary = _complete(_final_prompt(text, max_tokens, max_concurrency, usage), max_tokens, usage)
+
+    if cache is not None:
+        cache.put(key, summary)
+    return summary
+
+
+def generate_summary(text, max_tokens=500, max_concurrency=None, usage=None,
+                     document_type=None, summary_format=None, use_cache=True, condense_tokens=None):
+    """
+    Generate a summary of the provided text with the configured LLM backend.
+
     Args:
         text (str): The text to summarize
         max_tokens (int): Maximum length of the summary
-        
+        max_concurrency (int): Maximum LLM calls in flight when a long
+            document is map-reduced
+        usage (TokenUsage): Tally to add the actual prompt and completion
+            tokens of every LLM call to
+        document_type (str): Document type option, part of the cache key
+        summary_format (str): Summary format option, part of the cache key
+        use_cache (bool): Whether to reuse a cached summary of the same
+            text and options
+        condense_tokens (int): If set, long text is first cut to its most
+            central sentences within this many tokens (see condense_text)
+
     Returns:
         str: The generated summary
     """
     try:
-        # For testing mode, return a mock summary
-        if os.environ.get('TESTING', 'False').lower() == 'true':
-            return "This is a test summary generated for automated testing purposes."
-        
-        # Use OpenAI API to generate summary
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes PDF documents."},
-                {"role": "user", "content": f"Please summarize the following text in a concise, well-structured format. Focus on the key points and main ideas:\n\n{text}"}
-            ],
-            max_tokens=max_tokens,
-            temperature=0.5,
-        )
-        
-        # Extract and return the summary
-        summary = response.choices[0].message.content.strip()
-        return summary
-    
+        return summarize_text(text, max_tokens, max_concurrency, usage,
+                              document_type, summary_format, use_cache, condense_tokens)
+
     except Exception as e:
         # Log the error and return a generic message
         print(f"Error generating summary: {str(e)}")
         return "An error occurred while generating the summary. Please try again later."
+
+
+def stream_summary(text, max_tokens=500, max_concurrency=None, usage=None,
+                   document_type=None, summary_format=None, use_cache=True, condense_tokens=None):
+    """
+    Generate a summary, yielding its text as the model writes it.
+
+    Takes the same arguments as generate_summary and costs the same: long
+    documents are still map-reduced, and only the final call is streamed.
+    A cached summary is yielded in one piece. Use as
+    ``summary = yield from stream_summary(...)``.
+
+    Raises:
+        LLMBackendError: If the model call fails; unlike generate_summary,
+            errors are left to the caller, which may have sent part of the
+            summary already
+    """
+    cache = get_summary_cache() if use_cache else None
+    if cache is not None:
+        key = summary_cache_key(text, MODEL, document_type, summary_format, max_tokens, condense_tokens)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return cached
+
+    text = _condense(text, condense_tokens)
+    prompt = _final_prompt(text, max_tokens, max_concurrency, usage)
+    result = yield from get_llm_backend().stream(_messages(prompt), MODEL, max_tokens, temperature=0.5)
+    if usage is not None:
+        usage.add(result.prompt_tokens, result.completion_tokens)
+
+    if cache is not None:
+        cache.put(key, result.text)
+    return result.text
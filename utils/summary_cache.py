@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from utils.storage_codec import compress_text, decompress_text
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'summary_cache.sqlite3')
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_TTL = 7 * 24 * 3600
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def summary_cache_key(text, model, document_type=None, summary_format=None, max_tokens=None,
+                      condense_tokens=None):
+    """
+    Build the cache key for one summary request.
+
+    Whitespace is collapsed before hashing, so the same document extracted
+    with different line wrapping still hits.
+
+    Args:
+        text (str): The text being summarized
+        model (str): Model producing the summary
+        document_type (str): Document type option, if any
+        summary_format (str): Summary format option, if any
+        max_tokens (int): Summary length limit
+        condense_tokens (int): Budget the text was condensed to, if any
+
+    Returns:
+        str: Hex SHA-256 identifying the request
+    """
+    params = [model, document_type, summary_format, max_tokens]
+    if condense_tokens:
+        # Only condensed requests get the extra field, so existing keys stay valid
+        params.append(condense_tokens)
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(_WHITESPACE_RE.sub(' ', text).strip().encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """
+    Two-level cache of generated summaries keyed by summary_cache_key.
+
+    A small in-memory LRU answers repeat requests within a worker; behind
+    it a SQLite file keeps entries across restarts and is shared by every
+    worker on the host. Entries expire ttl seconds after they are written,
+    and once the file holds more than max_entries the least recently used
+    rows are deleted. Summaries are compressed in the file but kept as
+    text in memory.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl=DEFAULT_TTL, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS summaries ('
+            ' key TEXT PRIMARY KEY,'
+            ' summary BLOB NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_summaries_accessed_at ON summaries (accessed_at)')
+
+    def get(self, key):
+        """
+        Look up a cached summary.
+
+        Returns:
+            str: The summary, or None on a miss or an expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now - self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            try:
+                row = self._conn.execute(
+                    'SELECT summary, created_at FROM summaries WHERE key = ? AND created_at > ?',
+                    (key, now - self.ttl)).fetchone()
+                if row is not None:
+                    self._conn.execute('UPDATE summaries SET accessed_at = ? WHERE key = ?', (now, key))
+            except sqlite3.Error as e:
+                # A busy or damaged cache file only costs a fresh summary
+                print(f"Error reading summary cache: {str(e)}")
+                row = None
+            if row is None:
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+
+            summary = decompress_text(row[0])
+            self._remember(key, summary, row[1])
+            self.hits += 1
+            return summary
+
+    def put(self, key, summary):
+        """Store a summary, evicting expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, summary, now)
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO summaries (key, summary, created_at, accessed_at)'
+                    ' VALUES (?, ?, ?, ?)', (key, compress_text(summary), now, now))
+                self._evict(now)
+            except sqlite3.Error as e:
+                print(f"Error writing summary cache: {str(e)}")
+
+    def _remember(self, key, summary, created_at):
+        """Keep an entry in the memory tier; caller holds the lock"""
+        self._memory[key] = (summary, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drop expired rows and trim to max_entries; caller holds the lock"""
+        self._conn.execute('DELETE FROM summaries WHERE created_at <= ?', (now - self.ttl,))
+        self._conn.execute(
+            'DELETE FROM summaries WHERE key IN ('
+            ' SELECT key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,))
+
+    def stats(self):
+        """Get hit/miss counters and the number of stored summaries"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM summaries').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+            }
+
+
+def get_summary_cache():
+    """Get the process-wide summary cache configured from the environment"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SummaryCache(
+                path=os.environ.get('SUMMARY_CACHE_PATH', DEFAULT_CACHE_PATH),
+                max_entries=int(os.environ.get('SUMMARY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+                ttl=int(os.environ.get('SUMMARY_CACHE_TTL', DEFAULT_TTL)),
+            )
+        return _default_cache
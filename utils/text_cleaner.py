@@ -0,0 +1,126 @@
+import re
+from collections import Counter
+from utils.token_counter import count_tokens
+
+# Only the first and last few lines of a page are treated as running
+# header/footer candidates, so repeated body text is never removed
+ZONE_LINES = 4
+
+# A line must appear on at least this share of pages to count as boilerplate
+MIN_REPEAT_RATIO = 0.5
+
+_DIGITS_RE = re.compile(r'\d+')
+# Numbers that look like page numbering: "page 3", "3 of 10", "3/10", or a
+# number at the very start or end of a line. Other digits are content.
+_PAGE_NUMBERING_RE = re.compile(
+    r'\bpage\s*\d+(\s*(of|/)\s*\d+)?\b|\b\d+\s*(of|/)\s*\d+\b|^\d+\b|\b\d+$')
+_SPACES_RE = re.compile(r'[ \t\f\v\u00a0]+')
+_HYPHENATION_RE = re.compile(r'([a-z])-\n\s*([a-z])')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_PAGE_NUMBER_RE = re.compile(r'^(page\s*)?#(\s*(of|/)\s*#)?$')
+
+
+class NormalizationReport:
+    """What the normalization stage removed from a document."""
+
+    def __init__(self, removed_lines, chars_before, chars_after, tokens_before, tokens_after):
+        self.removed_lines = removed_lines
+        self.chars_before = chars_before
+        self.chars_after = chars_after
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+
+    @property
+    def tokens_saved(self):
+        """Tokens no longer sent to the LLM"""
+        return self.tokens_before - self.tokens_after
+
+
+def _line_key(line):
+    """Normalize a line so running headers match even when page numbers differ"""
+    key = _SPACES_RE.sub(' ', line).strip().lower()
+    return _PAGE_NUMBERING_RE.sub(lambda match: _DIGITS_RE.sub('#', match.group()), key)
+
+
+def _zone_indices(lines, size=ZONE_LINES):
+    """Indices of the non-empty lines at the top and bottom of a page"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:size] + filled[-size:])
+
+
+def _has_body(lines):
+    """
+    Whether a page is long enough for its header and footer zones to leave
+    body text between them. On shorter pages (slides, title pages) every
+    line is in a zone, so repeated lines there are content, not boilerplate.
+    """
+    return sum(1 for line in lines if line.strip()) >= 2 * ZONE_LINES
+
+
+def _clean_whitespace(text):
+    """Rejoin hyphenated line breaks and collapse whitespace runs"""
+    text = _HYPHENATION_RE.sub(r'\1\2', text)
+    text = "\n".join(_SPACES_RE.sub(' ', line).strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def normalize_pages(pages, min_repeat_ratio=MIN_REPEAT_RATIO):
+    """
+    Strip repeated headers, footers and page numbers, and tidy whitespace.
+
+    Lines near the top or bottom of a page whose normalized form (page
+    numbering masked, whitespace collapsed) shows up on at least
+    min_repeat_ratio of the pages are removed, as are bare page numbers on
+    the first or last line of a page. Only pages of at least 2 * ZONE_LINES
+    lines take part in the repeated-line check, and a page is never
+    emptied completely. Hyphenated line breaks are rejoined and whitespace
+    runs collapsed.
+
+    Args:
+        pages (iterable): (page_number, text) tuples as extracted, e.g. a
+            list or a generator; they are read only once
+        min_repeat_ratio (float): Share of pages a line must repeat on
+
+    Returns:
+        tuple: (pages, NormalizationReport) with the cleaned pages in order
+    """
+    split_pages = [(page_num, text.split("\n")) for page_num, text in pages]
+    long_pages = [lines for _, lines in split_pages if _has_body(lines)]
+
+    # Count each candidate line once per page it appears on
+    seen_on = Counter()
+    for lines in long_pages:
+        seen_on.update({_line_key(lines[i]) for i in _zone_indices(lines)})
+    threshold = max(2, min_repeat_ratio * len(long_pages))
+    repeated = {key for key, count in seen_on.items() if key and count >= threshold}
+
+    cleaned = []
+    removed_lines = 0
+    for page_num, lines in split_pages:
+        zone = _zone_indices(lines) if _has_body(lines) else set()
+        edges = _zone_indices(lines, size=1)
+        kept = []
+        removed = 0
+        for i, line in enumerate(lines):
+            if i in zone or i in edges:
+                key = _line_key(line)
+                if (i in zone and key in repeated) or (i in edges and _PAGE_NUMBER_RE.match(key)):
+                    removed += 1
+                    continue
+            kept.append(line)
+        if not any(line.strip() for line in kept):
+            # Everything on the page looked like boilerplate; keep it all
+            kept, removed = lines, 0
+        removed_lines += removed
+        cleaned.append((page_num, _clean_whitespace("\n".join(kept))))
+
+    before = "".join("\n".join(lines) for _, lines in split_pages)
+    after = "".join(text for _, text in cleaned)
+    report = NormalizationReport(
+        removed_lines=removed_lines,
+        chars_before=len(before),
+        chars_after=len(after),
+        tokens_before=count_tokens(before),
+        tokens_after=count_tokens(after),
+    )
+    return cleaned, report
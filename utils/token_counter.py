@@ -0,0 +1,164 @@
+import re
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+except ImportError:  # optional; the local approximation is used instead
+    tiktoken = None
+
+# Context window sizes, in tokens, for the models the plans use
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+}
+
+# USD per 1K tokens (prompt, completion), for cost predictions
+PRICING = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+}
+
+# Chat framing overhead per message and for priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+CACHE_SIZE = 2048
+
+# Same split as the cl100k pre-tokenizer: contractions, letter runs,
+# 1-3 digit groups, punctuation runs and whitespace
+_PIECE_RE = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+",
+    re.IGNORECASE,
+)
+
+_counts = OrderedDict()
+_counts_lock = threading.Lock()
+_encodings = {}
+
+
+def _approximate_count(text):
+    """
+    Count tokens offline, without a BPE vocabulary.
+
+    Pieces are split like cl100k does; common words are one token and
+    longer letter runs cost roughly one token per four characters.
+    """
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        stripped = piece.strip()
+        if not stripped or stripped.isdigit():
+            tokens += 1
+        elif not stripped[-1].isalpha():
+            tokens += 1 if len(stripped) <= 2 else math.ceil(len(stripped) / 2)
+        elif len(stripped) <= 7:
+            tokens += 1
+        else:
+            tokens += math.ceil(len(stripped) / 4)
+    return tokens
+
+
+def _get_encoding(model):
+    """Get the tiktoken encoding for a model, or None if unavailable offline"""
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            # Unknown model, or the vocabulary can't be fetched offline
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Count the tokens in a piece of text for a model.
+
+    Uses tiktoken when it is installed and its vocabulary is available,
+    and a local approximation otherwise. Counts are cached by the SHA-256
+    of the text, so repeat lookups for the same document are free.
+
+    Args:
+        text (str): The text to count
+        model (str): Model whose tokenizer to use
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+
+    key = (hashlib.sha256(text.encode('utf-8')).hexdigest(), model)
+    with _counts_lock:
+        if key in _counts:
+            _counts.move_to_end(key)
+            return _counts[key]
+
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        count = len(encoding.encode(text, disallowed_special=()))
+    else:
+        count = _approximate_count(text)
+
+    with _counts_lock:
+        _counts[key] = count
+        if len(_counts) > CACHE_SIZE:
+            _counts.popitem(last=False)
+    return count
+
+
+def count_chat_tokens(messages, model="gpt-3.5-turbo"):
+    """Count the prompt tokens a list of chat messages will use"""
+    return TOKENS_PER_REPLY + sum(
+        TOKENS_PER_MESSAGE + count_tokens(message["content"], model) for message in messages)
+
+
+def fits_context(prompt_tokens, max_tokens, model="gpt-3.5-turbo"):
+    """Whether a prompt plus the requested completion fits the model's context window"""
+    return prompt_tokens + max_tokens <= CONTEXT_WINDOWS.get(model, CONTEXT_WINDOWS["gpt-3.5-turbo"])
+
+
+def estimate_cost(prompt_tokens, completion_tokens, model="gpt-3.5-turbo"):
+    """Predict the USD cost of a call from its token counts"""
+    prompt_price, completion_price = PRICING.get(model, PRICING["gpt-3.5-turbo"])
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class TokenUsage:
+    """
+    Thread-safe tally of the tokens actually billed for one piece of work.
+
+    Pass one to generate_summary and it accumulates the usage reported by
+    every LLM call made for the document, including map-reduce calls.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens, completion_tokens):
+        """Record the usage of one LLM call"""
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+
+    @property
+    def total_tokens(self):
+        """Prompt and completion tokens combined"""
+        return self.prompt_tokens + self.completion_tokens
+
+    def recorded_tokens(self, text, model="gpt-3.5-turbo"):
+        """
+        Tokens to record against the plan for summarizing text.
+
+        The billed total when the LLM was called, and otherwise, when the
+        summary came from the cache, the text counted with the local
+        tokenizer, so a cached summary costs the same as a fresh one.
+        """
+        return self.total_tokens if self.calls else count_tokens(text, model)
@@ -0,0 +1,197 @@
+import io
+import os
+import mmap
+import hashlib
+import tempfile
+from flask import Request
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+
+PDF_MAGIC = b'%PDF-'
+
+# Uploads up to this size stay in memory; larger ones spool to a named
+# temporary file that is unique per upload
+SPOOL_MAX_MEMORY = int(os.environ.get('UPLOAD_SPOOL_MAX_MEMORY', 4 * 1024 * 1024))
+
+CHUNK_SIZE = 64 * 1024
+
+
+class IngestedUpload:
+    """
+    An uploaded file that has been read exactly once.
+
+    The SHA-256 and the leading bytes are computed while the request stream
+    is consumed, and the contents are kept either in memory or in a named
+    temporary file. Later stages read the contents through a read-only
+    buffer; the path is only handed to extraction worker processes.
+    """
+
+    def __init__(self, filename, size, sha256, header, data=None, file=None):
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.header = header
+        self._data = data
+        self._file = file
+        self._mapping = None
+
+    @property
+    def is_pdf(self):
+        """Whether the content starts with the PDF signature"""
+        return self.header.startswith(PDF_MAGIC)
+
+    @property
+    def in_memory(self):
+        """Whether the upload was small enough to stay in memory"""
+        return self._data is not None
+
+    @property
+    def path(self):
+        """Path of the spooled file, or None for uploads kept in memory"""
+        return self._file.name if self._file is not None else None
+
+    def buffer(self):
+        """
+        Get a read-only view of the whole upload.
+
+        Returns:
+            memoryview or mmap: Zero-copy access to the uploaded bytes
+        """
+        if self._data is not None:
+            return memoryview(self._data)
+        if self._mapping is None:
+            if self.size == 0:
+                return memoryview(b'')
+            self._mapping = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mapping
+
+    def open_stream(self):
+        """
+        Open an independent, seekable binary stream over the upload.
+
+        Each call gets its own read position, so several readers can work
+        on the same upload without interfering.
+        """
+        if self._data is not None:
+            # BytesIO shares the immutable bytes object rather than copying it
+            return io.BytesIO(self._data)
+        if self.size == 0:
+            return io.BytesIO(b'')
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Release the mapping and temporary file, if any"""
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = None
+
+
+class SpoolingRequest(Request):
+    """
+    Request that parses large file parts straight into named temporary files.
+
+    Werkzeug spools big parts to anonymous files by default, which
+    ingest_upload would then copy a second time. A named file can be
+    adopted by the upload as it is, and its path handed to extraction
+    workers instead of the bytes.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        if total_content_length is not None and total_content_length <= SPOOL_MAX_MEMORY:
+            return io.BytesIO()
+        return tempfile.NamedTemporaryFile(prefix='upload_', suffix='.pdf')
+
+
+def _adopt_spooled_file(file_storage, max_size=None):
+    """
+    Take over a file part that SpoolingRequest already wrote to disk.
+
+    The file is hashed through a read-only mapping rather than copied, and
+    the FileStorage is left holding an empty stream, so closing the request
+    no longer deletes the file; the upload owns it from here on.
+    """
+    spool_file = file_storage.stream
+    size = os.fstat(spool_file.fileno()).st_size
+    if max_size is not None and size > max_size:
+        raise RequestEntityTooLarge()
+    with mmap.mmap(spool_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        sha256 = hashlib.sha256(mapping).hexdigest()
+        header = mapping[:len(PDF_MAGIC)]
+    file_storage.stream = io.BytesIO()
+    filename = secure_filename(file_storage.filename or '')
+    return IngestedUpload(filename, size, sha256, header, file=spool_file)
+
+
+def _is_spooled_file(stream):
+    """Whether a FileStorage stream is a non-empty named file on disk"""
+    name = getattr(stream, 'name', None)
+    return (isinstance(name, str) and os.path.isfile(name)
+            and os.fstat(stream.fileno()).st_size > 0)
+
+
+def ingest_upload(file_storage, spool_max_memory=None, chunk_size=CHUNK_SIZE, max_size=None):
+    """
+    Consume an uploaded file's stream once, hashing and spooling it.
+
+    A part that SpoolingRequest already wrote to a named file is adopted
+    in place instead of being copied.
+
+    Args:
+        file_storage (FileStorage): The Werkzeug upload to read
+        spool_max_memory (int): Size above which the upload is written to
+            a temporary file instead of kept in memory
+        chunk_size (int): Bytes read from the request stream at a time
+        max_size (int): Largest accepted file size; reading stops and
+            RequestEntityTooLarge is raised at max_size + 1 bytes
+
+    Returns:
+        IngestedUpload: The hashed, spooled upload
+    """
+    if _is_spooled_file(file_storage.stream):
+        return _adopt_spooled_file(file_storage, max_size)
+
+    if spool_max_memory is None:
+        spool_max_memory = SPOOL_MAX_MEMORY
+
+    digest = hashlib.sha256()
+    chunks = []
+    spool_file = None
+    header = b''
+    size = 0
+
+    stream = file_storage.stream
+    while True:
+        read_size = chunk_size
+        if max_size is not None:
+            read_size = min(chunk_size, max_size + 1 - size)
+        chunk = stream.read(read_size)
+        if not chunk:
+            break
+        if max_size is not None and size + len(chunk) > max_size:
+            if spool_file is not None:
+                spool_file.close()
+            raise RequestEntityTooLarge()
+        digest.update(chunk)
+        if len(header) < len(PDF_MAGIC):
+            header = (header + chunk)[:len(PDF_MAGIC)]
+        size += len(chunk)
+
+        if spool_file is None and size > spool_max_memory:
+            spool_file = tempfile.NamedTemporaryFile(prefix='upload_', suffix='.pdf')
+            spool_file.writelines(chunks)
+            chunks = []
+        if spool_file is not None:
+            spool_file.write(chunk)
+        else:
+            chunks.append(chunk)
+
+    filename = secure_filename(file_storage.filename or '')
+    if spool_file is not None:
+        spool_file.flush()
+        return IngestedUpload(filename, size, digest.hexdigest(), header, file=spool_file)
+    return IngestedUpload(filename, size, digest.hexdigest(), header, data=b''.join(chunks))